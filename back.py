@@ -1,46 +1,87 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 import ollama
-from typing import List
+from typing import Iterator, List, Tuple
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
 import json
+import os
+import threading
+import time
+from score_cache import ScoreCache, make_key
+from metrics import Metrics, copy_request_context
 
 app = Flask(__name__)
 logging.basicConfig(level=logging.INFO)
 
+
+def parse_keep_alive(value):
+    # Ollama takes a number of seconds or a duration string with a unit; a
+    # bare "-1" is not a valid duration, so numbers are passed as numbers
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+# The Ollama client honours OLLAMA_HOST, so a local fake server can stand in
+LLM_MODEL = os.environ.get("LLM_MODEL", "llama3.2")
+CONCURRENT_SCORING = os.environ.get("LLM_CONCURRENT_SCORING", "1") == "1"
+# Shared by every request, so this caps in-flight calls to the model server
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 4))
+# "per_question" makes one call per answer, "combined" scores the whole form in one call,
+# "similarity" scores against the nearest labelled answers without calling the LLM
+LLM_SCORING_MODE = os.environ.get("LLM_SCORING_MODE", "per_question")
+SIMILARITY_INDEX_PATH = os.environ.get("SIMILARITY_INDEX_PATH", "models/similarity_index")
+# Bump whenever the rubric changes so cached scores from the old prompt are ignored
+PROMPT_VERSION = "v2"
+FALLBACK_NOTES = "Error in assessment"
+# Structured mode asks for schema-constrained JSON, streams it and stops
+# generating as soon as a complete score object has arrived
+LLM_STRUCTURED_OUTPUT = os.environ.get("LLM_STRUCTURED_OUTPUT", "0") == "1"
+# Hard cap on generated tokens per call in structured mode
+LLM_MAX_TOKENS = int(os.environ.get("LLM_MAX_TOKENS", 160))
+# How long Ollama keeps the model loaded after a call: seconds, a duration
+# such as "30m", or -1 to keep it loaded forever
+LLM_KEEP_ALIVE = parse_keep_alive(os.environ.get("LLM_KEEP_ALIVE"))
+# Send one tiny call at start-up so the model and the rubric prefix are already loaded
+LLM_WARMUP = os.environ.get("LLM_WARMUP", "0") == "1"
+# Log prompt-eval vs eval time of every call as JSON
+LLM_TIMING_LOG = os.environ.get("LLM_TIMING_LOG", "0") == "1"
+SCORE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "depression_score": {"type": "number", "minimum": 1, "maximum": 10},
+        "notes": {"type": "string"}
+    },
+    "required": ["depression_score", "notes"]
+}
+
+score_cache = ScoreCache()
+metrics = Metrics("back")
+
+similarity_index = None
+
+llm_pool = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="llm")
+
+class ScoringUnavailableError(Exception):
+    pass
+
 @dataclass
 class QuestionResponse:
     question_number: int
     question_text: str
     student_response: str
 
-@app.route('/assess_depression', methods=['POST'])
-def assess_depression():
-    data = request.get_json()
-    user_type = data.get('user_type', 'Student')
-    responses = [
-        QuestionResponse(
-            resp.get('question_number', 0),
-            resp.get('question_text', ''),
-            resp.get('student_response', '')
-        )
-        for resp in data.get('responses', [])
-    ]
-
-    overall_depression = 0
-    result = {
-        "responses": [],
-        "overall_depression_scale": 0,
-        "depression_status": ""
-    }
-
-    for response in responses:
-        # Updated system prompt with JSON schema
-        system_prompt = f"""You are an AI model specializing in student mental health assessment. Your task is to assess potential signs of depression based on the student's response to a given question.
-
-        Here’s the question for your assessment:
-        - Question: '{response.question_text}'
-        - Student's Response: '{response.student_response}'
+# The rubric is a byte-identical static prefix shared by every call, so the
+# model server can reuse its KV cache; only the trailing user message varies
+SYSTEM_PROMPT = """You are an AI model specializing in student mental health assessment. Your task is to assess potential signs of depression based on the student's response to a given question. The question and the student's response are given in the next message.
 
         Your Task:
         - Rate the response on a scale of 1 to 10 for signs of depression:
@@ -53,60 +94,450 @@ def assess_depression():
         If you are unsure or the response is unclear, still provide a depression score in the range of 1 to 10. If the response is not related to depression, assign a neutral score of 5. 
 
         Your response should be in the following JSON format:
-        {{
+        {
           "depression_score": <number between 1 and 10>, 
           "notes": "<any notes or explanation you may have>"
-        }}
+        }
 
         Please ensure the response contains both a "depression_score" and "notes" key, even if the assessment is uncertain.
         """
 
-        ollama_response = ollama.chat(model='llama3.2', messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": response.student_response}
-        ])
+def build_user_message(response: QuestionResponse) -> str:
+    return f"Question: '{response.question_text}'\nStudent's Response: '{response.student_response}'"
 
-        # Display the question and Ollama's response directly in the terminal
-        print(f"Question: {response.question_text}")
-        print(f"Ollama response: {ollama_response['message']['content']}")
+def build_messages(response: QuestionResponse) -> List[dict]:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": build_user_message(response)}
+    ]
 
+def extract_score_object(text: str):
+    # Returns the first complete JSON object in text that has a
+    # depression_score, ignoring any prose or code fences around it
+    decoder = json.JSONDecoder()
+    start = text.find('{')
+    while start != -1:
         try:
-            depression_data = ollama_response['message']['content']
-            # Expecting the response to be a JSON string in the form of:
-            # {"depression_score": <score>, "notes": <any explanation>}
-            depression_info = json.loads(depression_data)
-
-            depression_score = depression_info.get('depression_score', 5)
-            notes = depression_info.get('notes', 'No specific notes')
-        except (KeyError, IndexError, ValueError, json.JSONDecodeError) as e:
-            print(f"Error parsing Ollama response: {e}")
-            depression_score = 5  # Default score if there's an issue
-            notes = "Error in assessment"
-
-        result["responses"].append({
-            "question_number": response.question_number,
-            "question_text": response.question_text,
-            "student_response": response.student_response,
-            "depression_score": float(depression_score),
-            "notes": notes
-        })
-
-        overall_depression += float(depression_score)
+            candidate, _ = decoder.raw_decode(text, start)
+        except ValueError:
+            candidate = None
+        if isinstance(candidate, dict) and 'depression_score' in candidate:
+            return candidate
+        start = text.find('{', start + 1)
+    return None
 
-    total_questions = len(responses)
-    overall_depression_scale = overall_depression / total_questions if total_questions > 0 else 0
+def record_llm_timings(ollama_response):
+    # Ollama reports durations in nanoseconds. Prompt eval is the cost of the
+    # (ideally cached) prompt, eval the cost of the generated tokens.
+    observe_llm_timings(
+        (ollama_response.get('prompt_eval_duration') or 0) / 1e9,
+        (ollama_response.get('eval_duration') or 0) / 1e9,
+        {
+            "prompt_eval_count": ollama_response.get('prompt_eval_count'),
+            "eval_count": ollama_response.get('eval_count'),
+            "load_ms": round((ollama_response.get('load_duration') or 0) / 1e6, 2)
+        }
+    )
+
+def observe_llm_timings(prompt_eval: float, generation: float, details: dict):
+    metrics.observe("llm_prompt_eval", prompt_eval)
+    metrics.observe("llm_eval", generation)
+    if LLM_TIMING_LOG:
+        logging.info(json.dumps({"llm_timing": {
+            **details,
+            "prompt_eval_ms": round(prompt_eval * 1000, 2),
+            "eval_ms": round(generation * 1000, 2)
+        }}))
+
+def call_llm_structured(messages: List[dict]) -> str:
+    started = time.perf_counter()
+    stream = ollama.chat(
+        model=LLM_MODEL,
+        messages=messages,
+        format=SCORE_SCHEMA,
+        options={"num_predict": LLM_MAX_TOKENS},
+        keep_alive=LLM_KEEP_ALIVE,
+        stream=True
+    )
+    content = ""
+    tokens = 0
+    first_token_at = None
+    timed = False
+    try:
+        for chunk in stream:
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            content += chunk['message']['content']
+            # Each streamed chunk carries one token; the final one reports the exact count
+            tokens = chunk.get('eval_count') or tokens + 1
+            if chunk.get('done'):
+                record_llm_timings(chunk)
+                timed = True
+            if '}' in chunk['message']['content'] and extract_score_object(content) is not None:
+                metrics.inc("llm_early_stops_total")
+                break
+    finally:
+        # Closing the stream drops the connection, which stops generation on the server
+        stream.close()
+    if not timed and first_token_at is not None:
+        # An early stop never sees the final chunk with the server's timings,
+        # so time to first token stands in for prompt eval, the rest for eval
+        observe_llm_timings(first_token_at - started, time.perf_counter() - first_token_at,
+                            {"eval_count": tokens, "measured": "client", "early_stop": True})
+    metrics.inc("llm_generated_tokens_total", tokens)
+    metrics.observe_count("llm_generated_tokens", tokens)
+    return content
+
+def call_llm(messages: List[dict], structured: bool = None) -> str:
+    if LLM_STRUCTURED_OUTPUT if structured is None else structured:
+        return call_llm_structured(messages)
+    ollama_response = ollama.chat(model=LLM_MODEL, messages=messages, keep_alive=LLM_KEEP_ALIVE)
+    record_llm_timings(ollama_response)
+    tokens = ollama_response.get('eval_count') or 0
+    metrics.inc("llm_generated_tokens_total", tokens)
+    metrics.observe_count("llm_generated_tokens", tokens)
+    return ollama_response['message']['content']
+
+def warm_up_llm():
+    # Loads the model and evaluates the shared rubric prefix once, so the
+    # first real request only pays for its own question and answer
+    try:
+        started = time.perf_counter()
+        ollama.chat(
+            model=LLM_MODEL,
+            messages=build_messages(QuestionResponse(0, "How are you?", "Fine.")),
+            options={"num_predict": 1},
+            keep_alive=LLM_KEEP_ALIVE
+        )
+        logging.info(f"LLM warm-up took {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        logging.warning(f"LLM warm-up failed: {str(e)}")
+
+def score_response(response: QuestionResponse) -> Tuple[float, str]:
+    with metrics.time_stage("prompt_build"):
+        messages = build_messages(response)
+
+    with metrics.time_stage("llm_call"):
+        depression_data = call_llm(messages)
+
+    # Display the question and Ollama's response directly in the terminal
+    print(f"Question: {response.question_text}")
+    print(f"Ollama response: {depression_data}")
+
+    parse_started = time.perf_counter()
+    try:
+        # Expecting the response to contain a JSON object in the form of:
+        # {"depression_score": <score>, "notes": <any explanation>}
+        depression_info = extract_score_object(depression_data)
+        if depression_info is None:
+            raise ValueError("No depression_score object in response")
+
+        depression_score = depression_info.get('depression_score', 5)
+        notes = depression_info.get('notes', 'No specific notes')
+    except (KeyError, IndexError, ValueError, json.JSONDecodeError) as e:
+        print(f"Error parsing Ollama response: {e}")
+        metrics.inc("llm_parse_failures_total")
+        depression_score = 5  # Default score if there's an issue
+        notes = FALLBACK_NOTES
+    metrics.observe("response_parse", time.perf_counter() - parse_started)
+
+    return depression_score, notes
+
+COMBINED_SYSTEM_PROMPT = """You are an AI model specializing in student mental health assessment. Your task is to assess potential signs of depression based on the student's responses to the numbered questions given in the next message.
+
+        Your Task:
+        - Rate each response on a scale of 1 to 10 for signs of depression:
+          - 1-2: No signs of depression.
+          - 3-4: Mild signs of depression.
+          - 5-6: Moderate signs of depression.
+          - 7-8: Noticeable signs of depression.
+          - 9-10: Significant signs of depression.
+
+        If you are unsure or a response is unclear, still provide a depression score in the range of 1 to 10. If a response is not related to depression, assign a neutral score of 5.
+
+        Your response should be a JSON array with exactly one object per numbered question:
+        [
+          {
+            "question_number": <number of the question>,
+            "depression_score": <number between 1 and 10>,
+            "notes": "<any notes or explanation you may have>"
+          }
+        ]
+
+        Respond with the JSON array only.
+        """
+
+def build_combined_prompt(responses: List[QuestionResponse]) -> str:
+    # Items are numbered by position because question_number repeats across categories
+    return "\n".join(
+        f"{index}. Question: '{response.question_text}'\n"
+        f"   Student's Response: '{response.student_response}'"
+        for index, response in enumerate(responses, start=1)
+    )
+
+def extract_score_items(text: str):
+    # Returns the first non-empty JSON array of objects in text, or such an
+    # array under a "scores"/"responses" key, ignoring any prose, code
+    # fences or other brackets around it
+    decoder = json.JSONDecoder()
+    for start, char in enumerate(text):
+        if char not in '[{':
+            continue
+        try:
+            candidate, _ = decoder.raw_decode(text, start)
+        except ValueError:
+            continue
+        if isinstance(candidate, dict):
+            candidate = candidate.get('scores', candidate.get('responses'))
+        if isinstance(candidate, list) and candidate and all(isinstance(item, dict) for item in candidate):
+            return candidate
+    return None
 
+def parse_combined_scores(content: str, count: int) -> dict:
+    # Returns {position: (score, notes)} for every valid item; anything
+    # missing, duplicated, out of range or malformed is left out
+    items = extract_score_items(content)
+    if items is None:
+        print("Error parsing combined Ollama response: no JSON array of scores found")
+        return {}
+
+    scores = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            position = int(item['question_number'])
+            depression_score = float(item['depression_score'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if not 1 <= position <= count or position in scores:
+            continue
+        if not 1 <= depression_score <= 10:
+            continue
+        scores[position] = (depression_score, item.get('notes', 'No specific notes'))
+    return scores
+
+def score_responses_combined(responses: List[QuestionResponse]) -> List[Tuple[float, str]]:
+    with metrics.time_stage("prompt_build"):
+        messages = [
+            {"role": "system", "content": COMBINED_SYSTEM_PROMPT},
+            {"role": "user", "content": build_combined_prompt(responses)}
+        ]
+
+    with metrics.time_stage("llm_call"):
+        content = call_llm(messages, structured=False)
+    print(f"Ollama combined response: {content}")
+
+    with metrics.time_stage("response_parse"):
+        scores = parse_combined_scores(content, len(responses))
+
+    # Only the items the model got wrong go back through per-question calls
+    missing = [index for index in range(len(responses)) if index + 1 not in scores]
+    if missing:
+        print(f"Falling back to per-question scoring for {len(missing)} of {len(responses)} questions")
+        metrics.inc("llm_combined_fallbacks_total", len(missing))
+        for index, score in score_per_question(responses, missing):
+            scores[index + 1] = score
+
+    return [scores[index + 1] for index in range(len(responses))]
+
+def get_similarity_index():
+    global similarity_index
+    if similarity_index is None:
+        from similarity_index import SimilarityIndex
+        index = SimilarityIndex(SIMILARITY_INDEX_PATH)
+        # A missing or wrong path would otherwise score everything a neutral 5.
+        # Not kept, so the index is picked up once it has been built.
+        if not index.questions:
+            logging.error(f"Similarity index at {SIMILARITY_INDEX_PATH} is missing or empty")
+            raise ScoringUnavailableError(f"Similarity index at {SIMILARITY_INDEX_PATH} is missing or empty")
+        similarity_index = index
+    return similarity_index
+
+SIMILARITY_NOTES = "Nearest labelled answers"
+
+def similarity_matches(responses: List[QuestionResponse]) -> List[Tuple[float, float]]:
+    # (score, confidence 0-100) per answer; answers to the same question are
+    # searched together in one matmul
+    by_question = {}
+    for index, response in enumerate(responses):
+        by_question.setdefault(response.question_text, []).append(index)
+
+    matches = [None] * len(responses)
+    with metrics.time_stage("similarity_search"):
+        for question_text, indices in by_question.items():
+            scored = get_similarity_index().score(
+                question_text, [responses[index].student_response for index in indices]
+            )
+            for index, match in zip(indices, scored):
+                matches[index] = match
+    return matches
+
+def score_per_question(responses: List[QuestionResponse], indices: List[int]) -> Iterator[Tuple[int, Tuple[float, str]]]:
+    # One LLM call per answer, all submitted to the shared pool at once when
+    # CONCURRENT_SCORING is on; yields (index, (score, notes)) in completion order
+    if CONCURRENT_SCORING:
+        futures = {
+            llm_pool.submit(copy_request_context().run, score_response, responses[index]): index
+            for index in indices
+        }
+        return ((futures[future], future.result()) for future in as_completed(futures))
+    return ((index, score_response(responses[index])) for index in indices)
+
+def cache_key(response: QuestionResponse, mode: str) -> str:
+    # Each mode scores with its own rubric, so their scores are kept apart
+    return make_key(LLM_MODEL, f"{PROMPT_VERSION}/{mode}", response.question_text, response.student_response)
+
+def iter_scores(responses: List[QuestionResponse], mode: str = None) -> Iterator[Tuple[int, float, str, float]]:
+    # Yields (index, depression_score, notes, confidence) as each answer is
+    # scored, in completion order. Cached answers come first and skip the LLM
+    # entirely. Only similarity scores have a confidence; LLM scores give None.
+    mode = mode or LLM_SCORING_MODE
+    if mode == "similarity":
+        # Cheap enough to recompute every time, so never cached
+        for index, (depression_score, confidence) in enumerate(similarity_matches(responses)):
+            yield index, depression_score, SIMILARITY_NOTES, confidence
+        return
+
+    misses = []
+    for index, response in enumerate(responses):
+        cached = score_cache.get(cache_key(response, mode))
+        if cached is not None:
+            yield index, cached['depression_score'], cached['notes'], None
+        else:
+            misses.append(index)
+
+    if not misses:
+        return
+
+    if mode == "combined":
+        fresh = zip(misses, score_responses_combined([responses[index] for index in misses]))
+    else:
+        fresh = score_per_question(responses, misses)
+
+    for index, (depression_score, notes) in fresh:
+        if notes != FALLBACK_NOTES:
+            score_cache.set(cache_key(responses[index], mode), {
+                "depression_score": depression_score,
+                "notes": notes
+            })
+        yield index, depression_score, notes, None
+
+def score_responses(responses: List[QuestionResponse], mode: str = None) -> List[Tuple[float, str]]:
+    scores = [None] * len(responses)
+    for index, depression_score, notes, _ in iter_scores(responses, mode):
+        scores[index] = (depression_score, notes)
+    return scores
+
+def parse_responses(data: dict) -> List[QuestionResponse]:
+    return [
+        QuestionResponse(
+            resp.get('question_number', 0),
+            resp.get('question_text', ''),
+            resp.get('student_response', '')
+        )
+        for resp in data.get('responses', [])
+    ]
+
+def response_record(response: QuestionResponse, depression_score: float, notes: str,
+                    confidence: float = None) -> dict:
+    record = {
+        "question_number": response.question_number,
+        "question_text": response.question_text,
+        "student_response": response.student_response,
+        "depression_score": float(depression_score),
+        "notes": notes
+    }
+    if confidence is not None:
+        record["confidence"] = confidence
+    return record
+
+def depression_status_for(overall_depression_scale: float) -> str:
     if overall_depression_scale > 7:
-        depression_status = "High depression risk"
+        return "High depression risk"
     elif overall_depression_scale > 4:
-        depression_status = "Moderate depression risk"
-    else:
-        depression_status = "Low depression risk"
+        return "Moderate depression risk"
+    return "Low depression risk"
+
+@app.route('/assess_depression', methods=['POST'])
+def assess_depression():
+    with metrics.track_request("assess_depression"):
+        return _assess_depression()
+
+def _assess_depression():
+    with metrics.time_stage("request_parse"):
+        data = request.get_json()
+        user_type = data.get('user_type', 'Student')
+        responses = parse_responses(data)
+
+    overall_depression = 0
+    result = {
+        "responses": [],
+        "overall_depression_scale": 0,
+        "depression_status": ""
+    }
+
+    records = [None] * len(responses)
+    try:
+        for index, depression_score, notes, confidence in iter_scores(responses, data.get('scoring_mode')):
+            records[index] = response_record(responses[index], depression_score, notes, confidence)
+            overall_depression += float(depression_score)
+    except ScoringUnavailableError as e:
+        metrics.inc("rejected_total")
+        return jsonify({"error": str(e)}), 503
+    result["responses"] = records
+
+    total_questions = len(responses)
+    overall_depression_scale = overall_depression / total_questions if total_questions > 0 else 0
 
     result["overall_depression_scale"] = overall_depression_scale
-    result["depression_status"] = depression_status
+    result["depression_status"] = depression_status_for(overall_depression_scale)
 
     return jsonify(result)
 
+@app.route('/assess_depression/stream', methods=['POST'])
+def assess_depression_stream():
+    # NDJSON: one {"type": "response", "index": ...} line per question as soon
+    # as it is scored, then a {"type": "summary"} line with the overall result
+    with metrics.time_stage("request_parse"):
+        data = request.get_json()
+        responses = parse_responses(data)
+        mode = data.get('scoring_mode')
+
+    def generate():
+        overall_depression = 0
+        try:
+            with metrics.track_request("assess_depression_stream"):
+                for index, depression_score, notes, confidence in iter_scores(responses, mode):
+                    overall_depression += float(depression_score)
+                    record = response_record(responses[index], depression_score, notes, confidence)
+                    yield json.dumps({"type": "response", "index": index, **record}) + "\n"
+        except Exception as e:
+            logging.error(f"Error processing request: {str(e)}")
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+            return
+
+        total_questions = len(responses)
+        overall_depression_scale = overall_depression / total_questions if total_questions > 0 else 0
+        yield json.dumps({
+            "type": "summary",
+            "overall_depression_scale": overall_depression_scale,
+            "depression_status": depression_status_for(overall_depression_scale)
+        }) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    gauges = {f"score_cache_{key}": value for key, value in score_cache.stats().items()}
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify(score_cache.stats())
+
+if LLM_WARMUP:
+    threading.Thread(target=warm_up_llm, name="llm-warmup", daemon=True).start()
+
 if __name__ == '__main__':
     app.run(debug=True)
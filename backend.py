@@ -1,18 +1,64 @@
-from flask import Flask, request, jsonify
+import time
+IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, Response, request, jsonify, stream_with_context
 import torch
 from transformers import RobertaTokenizer, RobertaForSequenceClassification
 import os
 from dataclasses import dataclass
+import csv
+import hashlib
+import hmac
+import io
+import json
 import logging
-from typing import List
+import threading
+from concurrent.futures import as_completed
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+from batcher import MicroBatcher, QueueFullError
+from score_cache import ScoreCache, make_key
+from metrics import Metrics
+from dataset_columns import META_COLUMNS, LABEL_COLUMN
 
 app = Flask(__name__)
 logging.basicConfig(level=logging.INFO)
 
 # Constants
 MAX_LENGTH = 128
-MODEL_PATH = "models/depression_roberta"
+MODEL_PATH = os.environ.get("MODEL_PATH", "models/depression_roberta")
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+# "torch" (fp32), "int8" (dynamic quantization) or "onnx" (ONNX Runtime)
+INFERENCE_ENGINE = os.environ.get("INFERENCE_ENGINE", "torch")
+ONNX_FILENAME = "model.onnx"
+
+# Cross-request micro-batching
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", 32))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", 10))
+BATCH_QUEUE_SIZE = int(os.environ.get("BATCH_QUEUE_SIZE", 1024))
+# Assessments scored per chunk by /assess_depression/batch before results stream out
+COHORT_CHUNK_SIZE = int(os.environ.get("COHORT_CHUNK_SIZE", 256))
+# Part of the cache key; bump when the analysis text format changes
+PROMPT_VERSION = "v1"
+# "lazy" loads the model on the first request or readiness probe,
+# "background" starts loading as soon as the module is imported
+MODEL_LOAD = os.environ.get("MODEL_LOAD", "lazy")
+WARMUP_TEXTS = [
+    "Question: How have you been sleeping lately? Answer: Fine, about eight hours.",
+    "Question: Do you feel hopeless about the future? Answer: Sometimes it feels like nothing will ever get better.",
+    "Question: Do you feel lonely or isolated? Answer: No.",
+]
+# Poll the served model's directory every this many seconds and hot-swap
+# when its files change; 0 disables the watcher
+MODEL_WATCH_INTERVAL = float(os.environ.get("MODEL_WATCH_INTERVAL", 0))
+# Expected in the X-Admin-Token header; the /admin endpoints are disabled when unset
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+# How long a swapped-out model waits for the requests still using it
+MODEL_DRAIN_TIMEOUT = float(os.environ.get("MODEL_DRAIN_TIMEOUT", 60))
+# After a failed load, the next request or probe retries once this many seconds have passed
+MODEL_LOAD_RETRY_SECONDS = float(os.environ.get("MODEL_LOAD_RETRY_SECONDS", 30))
+
+metrics = Metrics("backend")
 
 @dataclass
 class StudentResponse:
@@ -21,14 +67,45 @@ class StudentResponse:
     response_text: str
 
 class DepressionDetector:
-    def __init__(self):
-        self.tokenizer = RobertaTokenizer.from_pretrained(MODEL_PATH)
+    def __init__(self, model_path: str = MODEL_PATH, engine: str = INFERENCE_ENGINE):
+        self.model_path = model_path
+        self.engine = engine
+        self.tokenizer = RobertaTokenizer.from_pretrained(model_path)
+
+        if engine == "onnx":
+            import onnxruntime as ort
+            self.model = None
+            self.session = ort.InferenceSession(
+                os.path.join(model_path, ONNX_FILENAME),
+                providers=["CPUExecutionProvider"]
+            )
+            return
+
         self.model = RobertaForSequenceClassification.from_pretrained(
-            MODEL_PATH,
+            model_path,
             num_labels=5  # 5 levels of depression severity
-        ).to(DEVICE)
+        )
+        if engine == "int8":
+            # Dynamic quantization only runs on CPU
+            self.model = torch.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        elif engine != "torch":
+            raise ValueError(f"Unknown inference engine: {engine}")
+        self.model.to(DEVICE if engine == "torch" else "cpu")
         self.model.eval()
 
+    def logits(self, inputs: dict) -> torch.Tensor:
+        if self.engine == "onnx":
+            outputs = self.session.run(["logits"], {
+                'input_ids': inputs['input_ids'].cpu().numpy(),
+                'attention_mask': inputs['attention_mask'].cpu().numpy()
+            })
+            return torch.from_numpy(outputs[0])
+        if self.engine == "int8":
+            inputs = {key: value.cpu() for key, value in inputs.items()}
+        return self.model(**inputs).logits
+
     def preprocess_text(self, text: str) -> torch.Tensor:
         encoded = self.tokenizer.encode_plus(
             text,
@@ -47,8 +124,7 @@ class DepressionDetector:
         inputs = self.preprocess_text(text)
         
         with torch.no_grad():
-            outputs = self.model(**inputs)
-            predictions = torch.nn.functional.softmax(outputs.logits, dim=1)
+            predictions = torch.nn.functional.softmax(self.logits(inputs), dim=1)
             depression_score = torch.argmax(predictions).item()
             confidence = predictions[0][depression_score].item()
 
@@ -57,44 +133,400 @@ class DepressionDetector:
             'confidence': round(confidence * 100, 2)
         }
 
-# Initialize the detector
-detector = DepressionDetector()
+    def preprocess_batch(self, texts: List[str]) -> dict:
+        # Pad only to the longest text in the batch instead of MAX_LENGTH
+        encoded = self.tokenizer(
+            texts,
+            add_special_tokens=True,
+            max_length=MAX_LENGTH,
+            padding='longest',
+            truncation=True,
+            return_tensors='pt'
+        )
+        return {
+            'input_ids': encoded['input_ids'].to(DEVICE),
+            'attention_mask': encoded['attention_mask'].to(DEVICE)
+        }
+
+    def predict_batch(self, texts: List[str]) -> List[dict]:
+        if not texts:
+            return []
+
+        with metrics.time_stage("tokenize"):
+            inputs = self.preprocess_batch(texts)
+
+        with torch.no_grad():
+            with metrics.time_stage("forward"):
+                logits = self.logits(inputs)
+            with metrics.time_stage("softmax"):
+                predictions = torch.nn.functional.softmax(logits, dim=1)
+                confidences, depression_scores = torch.max(predictions, dim=1)
+
+        return [
+            {
+                'depression_score': score + 1,  # 1-5 scale
+                'confidence': round(confidence * 100, 2)
+            }
+            for score, confidence in zip(depression_scores.tolist(), confidences.tolist())
+        ]
+
+class ModelNotReadyError(Exception):
+    pass
+
+def model_version(model_path: str) -> str:
+    # Fingerprint of the files in a saved model directory; changes whenever
+    # training.py or engine_tools.py writes a new model there
+    digest = hashlib.sha1()
+    for name in sorted(os.listdir(model_path)):
+        file_path = os.path.join(model_path, name)
+        if os.path.isfile(file_path):
+            stat = os.stat(file_path)
+            digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+class LoadedModel:
+    # A detector with its own batcher. Requests lease the active model for
+    # their whole duration, so a swap never moves a request between models,
+    # and a swapped-out model's batcher is closed once its last lease ends.
+    def __init__(self, detector: DepressionDetector, version: str):
+        self.detector = detector
+        self.version = version
+        self.model_path = detector.model_path
+        self.loaded_at = time.time()
+        self.batcher = MicroBatcher(
+            detector.predict_batch,
+            max_batch_size=BATCH_MAX_SIZE,
+            max_wait_ms=BATCH_MAX_WAIT_MS,
+            max_queue_size=BATCH_QUEUE_SIZE
+        )
+        self._leases = 0
+        self._idle = threading.Condition()
+
+    def acquire(self):
+        with self._idle:
+            self._leases += 1
+
+    def release(self):
+        with self._idle:
+            self._leases -= 1
+            if self._leases == 0:
+                self._idle.notify_all()
+
+    def retire(self, timeout: float):
+        with self._idle:
+            drained = self._idle.wait_for(lambda: self._leases == 0, timeout)
+        if not drained:
+            logging.warning(f"Model {self.version} still had requests after {timeout}s; closing its queue anyway")
+        self.batcher.close()
+        logging.info(f"Model {self.version} retired")
+
+    def describe(self) -> dict:
+        return {
+            "version": self.version,
+            "model_path": self.model_path,
+            "engine": self.detector.engine,
+            "loaded_at": self.loaded_at,
+        }
+
+# The detector is built off the import path so the app can bind its port
+# straight away; /readyz reports when it is warm
+active_model = None
+# Kept in memory after a swap so a rollback needs no load
+previous_model = None
+# Mirrors of active_model for callers that only need the current objects
+detector = None
+batcher = None
+model_ready = threading.Event()
+load_error = None
+_loader_lock = threading.Lock()
+_loader_thread = None
+_load_failed_at = None
+_active_lock = threading.Lock()
+# Held for the whole of a reload or rollback, so only one runs at a time
+_reload_lock = threading.Lock()
+reload_status = {"state": "idle"}
+# Versions rolled back from, which the watcher must not swap straight back in
+rolled_back_versions = set()
+_watch_thread = None
+startup_timings = {}
+score_cache = ScoreCache()
+
+def build_detector(warmup: bool = True) -> DepressionDetector:
+    started = time.perf_counter()
+    new_detector = DepressionDetector()
+    startup_timings["load_seconds"] = round(time.perf_counter() - started, 3)
+
+    if warmup:
+        warm_up(new_detector)
+    return new_detector
+
+def warm_up(new_detector: DepressionDetector):
+    # Warm-up pass so the first real request doesn't pay for lazy allocations
+    started = time.perf_counter()
+    new_detector.predict_batch(WARMUP_TEXTS)
+    startup_timings["warmup_seconds"] = round(time.perf_counter() - started, 3)
+
+def activate_detector(new_detector: DepressionDetector):
+    swap_model(LoadedModel(new_detector, model_version(new_detector.model_path)))
+    model_ready.set()
+    logging.info(f"Model ready: {startup_timings}")
+    start_model_watch()
+
+def swap_model(new_model: LoadedModel):
+    global active_model, previous_model, detector, batcher
+    with _active_lock:
+        old_model = active_model
+        active_model = new_model
+        detector, batcher = new_model.detector, new_model.batcher
+    if old_model is not None:
+        previous_model = old_model
+        # Requests already holding the old model finish on it
+        threading.Thread(target=old_model.retire, args=(MODEL_DRAIN_TIMEOUT,),
+                         name="model-retire", daemon=True).start()
+    logging.info(f"Serving model {new_model.version} from {new_model.model_path}")
+
+def smoke_test(candidate: DepressionDetector):
+    # Also serves as the warm-up: every warm-up text must get a valid level
+    predictions = candidate.predict_batch(WARMUP_TEXTS)
+    if len(predictions) != len(WARMUP_TEXTS):
+        raise ValueError(f"Smoke test returned {len(predictions)} predictions for {len(WARMUP_TEXTS)} texts")
+    for prediction in predictions:
+        if prediction['depression_score'] not in range(1, 6) or not 0 <= prediction['confidence'] <= 100:
+            raise ValueError(f"Smoke test prediction out of range: {prediction}")
+
+def reload_model(model_path: str = None) -> bool:
+    # Loads, warms and checks the model in the background, then swaps it in.
+    # Returns False if a reload or rollback is already running.
+    global reload_status
+    if not _reload_lock.acquire(blocking=False):
+        return False
+    model_path = model_path or (active_model.model_path if active_model else MODEL_PATH)
+    reload_status = {"state": "loading", "model_path": model_path, "started_at": time.time()}
+    threading.Thread(target=_reload, args=(model_path,), name="model-reload", daemon=True).start()
+    return True
+
+def _reload(model_path: str):
+    global reload_status, load_error
+    started = time.perf_counter()
+    version = None
+    try:
+        version = model_version(model_path)
+        candidate = DepressionDetector(model_path, INFERENCE_ENGINE)
+        load_seconds = time.perf_counter() - started
+        smoke_test(candidate)
+        if model_version(model_path) != version:
+            raise ValueError("Model files changed while loading")
+        swap_model(LoadedModel(candidate, version))
+        load_error = None
+        model_ready.set()
+        metrics.inc("model_reloads_total")
+        reload_status = {
+            "state": "succeeded",
+            "model_path": model_path,
+            "version": version,
+            "load_seconds": round(load_seconds, 3),
+            "total_seconds": round(time.perf_counter() - started, 3),
+        }
+    except Exception as e:
+        metrics.inc("model_reload_failures_total")
+        logging.error(f"Reload of {model_path} failed, still serving the current model: {str(e)}")
+        reload_status = {"state": "failed", "model_path": model_path, "version": version, "error": str(e)}
+    finally:
+        _reload_lock.release()
+
+def rollback_model() -> LoadedModel:
+    # Swaps the previous model back in; raises ValueError if there is none
+    if not _reload_lock.acquire(blocking=False):
+        raise RuntimeError("A reload is in progress")
+    try:
+        if previous_model is None:
+            raise ValueError("No previous model to roll back to")
+        rolled_back_versions.add(active_model.version)
+        restored = LoadedModel(previous_model.detector, previous_model.version)
+        swap_model(restored)
+        metrics.inc("model_rollbacks_total")
+        return restored
+    finally:
+        _reload_lock.release()
+
+def watch_model_path():
+    # Reloads once the served directory's files change and then stay
+    # unchanged for a whole interval, so a half-written save is never loaded
+    seen = None
+    while True:
+        time.sleep(MODEL_WATCH_INTERVAL)
+        current = active_model
+        try:
+            version = model_version(current.model_path)
+        except OSError:
+            continue
+        failed = reload_status.get("state") == "failed" and reload_status.get("version") == version
+        if (version == seen and version != current.version
+                and version not in rolled_back_versions and not failed):
+            logging.info(f"Model files in {current.model_path} changed, reloading")
+            reload_model(current.model_path)
+        seen = version
+
+def start_model_watch():
+    # Called from activate_detector so it also runs in every serve.py worker
+    global _watch_thread
+    with _loader_lock:
+        if MODEL_WATCH_INTERVAL > 0 and _watch_thread is None:
+            _watch_thread = threading.Thread(target=watch_model_path, name="model-watch", daemon=True)
+            _watch_thread.start()
+
+def model_status() -> dict:
+    return {
+        "active": active_model.describe() if active_model else None,
+        "previous": previous_model.describe() if previous_model else None,
+        "reload": reload_status,
+        "watch_interval": MODEL_WATCH_INTERVAL,
+    }
+
+def model_info() -> dict:
+    # For the metrics info series; empty until a model is loaded
+    current = active_model
+    if current is None:
+        return {}
+    return {"model_info": {"app": metrics.app_name, "version": current.version, "engine": current.detector.engine}}
+
+def load_detector():
+    global load_error, _loader_thread, _load_failed_at
+    try:
+        activate_detector(build_detector())
+        load_error = None
+    except Exception as e:
+        load_error = str(e)
+        logging.error(f"Error loading model: {load_error}")
+        # Let a later request or probe start a fresh attempt
+        with _loader_lock:
+            _load_failed_at = time.monotonic()
+            _loader_thread = None
+
+def start_model_load():
+    global _loader_thread
+    with _loader_lock:
+        retry_due = _load_failed_at is None or time.monotonic() - _load_failed_at >= MODEL_LOAD_RETRY_SECONDS
+        if _loader_thread is None and retry_due and not model_ready.is_set():
+            _loader_thread = threading.Thread(target=load_detector, name="model-loader", daemon=True)
+            _loader_thread.start()
+    return _loader_thread
+
+@contextmanager
+def lease_model() -> Iterator[LoadedModel]:
+    # The model a request is scored with, held until the request is done
+    if not model_ready.is_set():
+        start_model_load()
+        raise ModelNotReadyError(load_error or "Model is still loading")
+    with _active_lock:
+        current = active_model
+        current.acquire()
+    try:
+        yield current
+    finally:
+        current.release()
+
+def record_first_prediction():
+    if "first_prediction_seconds" not in startup_timings:
+        startup_timings["first_prediction_seconds"] = round(time.perf_counter() - IMPORT_STARTED, 3)
+        logging.info(f"First prediction {startup_timings['first_prediction_seconds']}s after import")
+
+def cache_key(response: StudentResponse, current: LoadedModel) -> str:
+    # Keyed on the model version so a swap never serves the old model's scores,
+    # and on the engine so int8/onnx scores are never fp32 ones in disguise
+    return make_key(f"{current.version}/{current.detector.engine}", PROMPT_VERSION,
+                    response.question_text, response.response_text)
+
+def analysis_text(response: StudentResponse) -> str:
+    # Combine question and answer for context
+    return f"Question: {response.question_text} Answer: {response.response_text}"
+
+def iter_predictions(responses: List[StudentResponse], current: LoadedModel) -> Iterator[Tuple[int, dict]]:
+    # Yields (index, prediction) as each answer is scored; cached answers first
+    misses = []
+    cached_predictions = []
+    with metrics.time_stage("cache_lookup"):
+        for index, response in enumerate(responses):
+            cached = score_cache.get(cache_key(response, current))
+            if cached is not None:
+                cached_predictions.append((index, cached))
+            else:
+                misses.append(index)
+    yield from cached_predictions
+
+    if not misses:
+        return
+
+    # Queue the answers alongside other in-flight requests
+    submitted = time.perf_counter()
+    futures = {current.batcher.submit(analysis_text(responses[index])): index for index in misses}
+    for future in as_completed(futures):
+        index = futures[future]
+        prediction = future.result()
+        record_first_prediction()
+        score_cache.set(cache_key(responses[index], current), prediction)
+        yield index, prediction
+    # Time from queueing the answers to the last one coming back from the batcher
+    metrics.observe("batch_wait", time.perf_counter() - submitted)
+
+def predict_with_cache(responses: List[StudentResponse], current: LoadedModel) -> List[dict]:
+    predictions = [None] * len(responses)
+    for index, prediction in iter_predictions(responses, current):
+        predictions[index] = prediction
+    return predictions
+
+def parse_responses(data: dict) -> List[StudentResponse]:
+    return [
+        StudentResponse(
+            resp.get('question_number', 0),
+            resp.get('question_text', ''),
+            resp.get('response_text', '')
+        )
+        for resp in data.get('responses', [])
+    ]
+
+def response_record(response: StudentResponse, prediction: dict) -> dict:
+    return {
+        "question_number": response.question_number,
+        "question_text": response.question_text,
+        "response_text": response.response_text,
+        "depression_score": prediction['depression_score'],
+        "confidence": prediction['confidence']
+    }
+
+def risk_level_for(avg_score: float) -> str:
+    if avg_score >= 4:
+        return "High Risk"
+    elif avg_score >= 3:
+        return "Moderate Risk"
+    elif avg_score >= 2:
+        return "Low Risk"
+    return "Minimal Risk"
 
 @app.route('/assess_depression', methods=['POST'])
 def assess_depression():
+    with metrics.track_request("assess_depression"):
+        return _assess_depression()
+
+def _assess_depression():
     try:
-        data = request.get_json()
-        responses = [
-            StudentResponse(
-                resp.get('question_number', 0),
-                resp.get('question_text', ''),
-                resp.get('response_text', '')
-            )
-            for resp in data.get('responses', [])
-        ]
+        with metrics.time_stage("request_parse"):
+            data = request.get_json()
+            responses = parse_responses(data)
+
+        with lease_model() as current:
+            predictions = predict_with_cache(responses, current)
 
         results = {
             "responses": [],
             "overall_depression_score": 0,
-            "risk_level": ""
+            "risk_level": "",
+            "model_version": current.version
         }
 
         total_score = 0
-        for response in responses:
-            # Combine question and answer for context
-            analysis_text = f"Question: {response.question_text} Answer: {response.response_text}"
-            
-            # Get prediction
-            prediction = detector.predict_depression_level(analysis_text)
-            
-            results["responses"].append({
-                "question_number": response.question_number,
-                "question_text": response.question_text,
-                "response_text": response.response_text,
-                "depression_score": prediction['depression_score'],
-                "confidence": prediction['confidence']
-            })
-            
+        for response, prediction in zip(responses, predictions):
+            results["responses"].append(response_record(response, prediction))
             total_score += prediction['depression_score']
 
         # Calculate overall score
@@ -102,20 +534,225 @@ def assess_depression():
         results["overall_depression_score"] = round(avg_score, 2)
 
         # Determine risk level
-        if avg_score >= 4:
-            results["risk_level"] = "High Risk"
-        elif avg_score >= 3:
-            results["risk_level"] = "Moderate Risk"
-        elif avg_score >= 2:
-            results["risk_level"] = "Low Risk"
-        else:
-            results["risk_level"] = "Minimal Risk"
+        results["risk_level"] = risk_level_for(avg_score)
 
         return jsonify(results)
 
+    except (QueueFullError, ModelNotReadyError) as e:
+        logging.warning(f"Rejecting request: {str(e)}")
+        metrics.inc("rejected_total")
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         logging.error(f"Error processing request: {str(e)}")
+        metrics.inc("errors_total")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/assess_depression/stream', methods=['POST'])
+def assess_depression_stream():
+    # NDJSON: one {"type": "response", "index": ...} line per question as soon
+    # as it is scored, then a {"type": "summary"} line with the overall result
+    data = request.get_json()
+    responses = parse_responses(data)
+    if responses and not model_ready.is_set():
+        start_model_load()
+        return jsonify({"error": load_error or "Model is still loading"}), 503
+
+    def generate():
+        total_score = 0
+        try:
+            with metrics.track_request("assess_depression_stream"), lease_model() as current:
+                for index, prediction in iter_predictions(responses, current):
+                    total_score += prediction['depression_score']
+                    yield json.dumps({"type": "response", "index": index, **response_record(responses[index], prediction)}) + "\n"
+        except Exception as e:
+            logging.error(f"Error processing request: {str(e)}")
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+            return
+
+        avg_score = total_score / len(responses) if responses else 0
+        yield json.dumps({
+            "type": "summary",
+            "overall_depression_score": round(avg_score, 2),
+            "risk_level": risk_level_for(avg_score),
+            "model_version": current.version
+        }) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def parse_cohort_csv(file) -> List[dict]:
+    # Same wide layout as depression_dataset.csv: one row per respondent,
+    # one column per question
+    reader = csv.DictReader(io.TextIOWrapper(file, encoding='utf-8'))
+    question_columns = [c for c in reader.fieldnames or [] if c not in META_COLUMNS and c != LABEL_COLUMN]
+    return [
+        {
+            "id": row.get('s no'),
+            "responses": [
+                {"question_number": number, "question_text": question, "response_text": row.get(question) or ''}
+                for number, question in enumerate(question_columns, start=1)
+            ]
+        }
+        for row in reader
+    ]
+
+def score_unique(responses: List[StudentResponse], memo: dict, current: LoadedModel):
+    # Scores every distinct question/answer pair not already in memo. Pairs are
+    # sorted by length and fed to the batcher one batch at a time, which keeps
+    # padding low and the shared queue from filling up.
+    pending = {}
+    for response in responses:
+        key = cache_key(response, current)
+        if key in memo or key in pending:
+            continue
+        cached = score_cache.get(key)
+        if cached is not None:
+            memo[key] = cached
+        else:
+            pending[key] = analysis_text(response)
+
+    ordered = sorted(pending.items(), key=lambda item: len(item[1]))
+    for start in range(0, len(ordered), BATCH_MAX_SIZE):
+        chunk = ordered[start:start + BATCH_MAX_SIZE]
+        for (key, _), prediction in zip(chunk, current.batcher.predict_many([text for _, text in chunk])):
+            memo[key] = prediction
+            score_cache.set(key, prediction)
+
+def valid_cohort(assessments) -> bool:
+    return isinstance(assessments, list) and all(
+        isinstance(assessment, dict)
+        and isinstance(assessment.get('responses', []), list)
+        and all(isinstance(resp, dict) for resp in assessment.get('responses', []))
+        for assessment in assessments
+    )
+
+@app.route('/assess_depression/batch', methods=['POST'])
+def assess_depression_batch():
+    # Accepts a JSON array of assessments (or {"assessments": [...]}) or an
+    # uploaded CSV in the dataset.py layout, and streams one NDJSON result
+    # per assessment in input order
+    if 'file' in request.files:
+        assessments = parse_cohort_csv(request.files['file'].stream)
+    else:
+        data = request.get_json(silent=True)
+        assessments = data.get('assessments') if isinstance(data, dict) else data
+        # Checked before streaming starts: once the 200 headers are out, a bad
+        # body can only be reported as an error line
+        if not valid_cohort(assessments):
+            return jsonify({"error": "Expected a list of assessments, each with a 'responses' list"}), 400
+
+    if assessments and not model_ready.is_set():
+        start_model_load()
+        return jsonify({"error": load_error or "Model is still loading"}), 503
+
+    def generate():
+        # The whole cohort is scored by one model, even if a swap happens meanwhile
+        try:
+            with lease_model() as current:
+                yield from generate_cohort(current)
+        except ModelNotReadyError as e:
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+
+    def generate_cohort(current):
+        # Identical pairs are scored once across the whole cohort
+        memo = {}
+        for start in range(0, len(assessments), COHORT_CHUNK_SIZE):
+            chunk = [
+                (position, assessment.get('id', position), parse_responses(assessment))
+                for position, assessment in enumerate(assessments[start:start + COHORT_CHUNK_SIZE], start=start)
+            ]
+            try:
+                score_unique([response for _, _, responses in chunk for response in responses], memo, current)
+            except Exception as e:
+                logging.error(f"Error processing cohort chunk: {str(e)}")
+                yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+                return
+
+            for position, assessment_id, responses in chunk:
+                predictions = [memo[cache_key(response, current)] for response in responses]
+                avg_score = sum(p['depression_score'] for p in predictions) / len(responses) if responses else 0
+                yield json.dumps({
+                    "type": "assessment",
+                    "index": position,
+                    "id": assessment_id,
+                    "responses": [response_record(r, p) for r, p in zip(responses, predictions)],
+                    "overall_depression_score": round(avg_score, 2),
+                    "risk_level": risk_level_for(avg_score),
+                    "model_version": current.version
+                }) + "\n"
+
+        yield json.dumps({"type": "summary", "assessments": len(assessments), "unique_pairs": len(memo),
+                          "model_version": current.version}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/batch_stats', methods=['GET'])
+def batch_stats():
+    if batcher is None:
+        return jsonify({"error": "Model is still loading"}), 503
+    return jsonify(batcher.stats())
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    gauges = {f"score_cache_{key}": value for key, value in score_cache.stats().items()}
+    if batcher is not None:
+        gauges.update({f"batcher_{key}": value for key, value in batcher.stats().items()})
+    gauges["model_ready"] = model_ready.is_set()
+    if active_model is not None:
+        gauges["model_loaded_timestamp_seconds"] = active_model.loaded_at
+    return Response(metrics.render(gauges, model_info()), mimetype='text/plain; version=0.0.4')
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # Liveness only: the process is up and serving HTTP
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    if model_ready.is_set():
+        return jsonify({"status": "ready", "model_version": active_model.version, "timings": startup_timings})
+    start_model_load()
+    status = "failed" if load_error else "loading"
+    return jsonify({"status": status, "error": load_error, "timings": startup_timings}), 503
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify(score_cache.stats())
+
+def admin_authorized() -> bool:
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+@app.route('/admin/model', methods=['GET'])
+def admin_model():
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(model_status())
+
+@app.route('/admin/model/reload', methods=['POST'])
+def admin_reload():
+    # Optional body {"model_path": ...}; defaults to the directory being served.
+    # Returns straight away; poll /admin/model for the outcome.
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    data = request.get_json(silent=True) or {}
+    if not reload_model(data.get("model_path")):
+        return jsonify({"error": "A reload is already in progress", **model_status()}), 409
+    return jsonify(model_status()), 202
+
+@app.route('/admin/model/rollback', methods=['POST'])
+def admin_rollback():
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        rollback_model()
+    except (ValueError, RuntimeError) as e:
+        return jsonify({"error": str(e), **model_status()}), 409
+    return jsonify(model_status())
+
+startup_timings["import_seconds"] = round(time.perf_counter() - IMPORT_STARTED, 3)
+if MODEL_LOAD == "background":
+    start_model_load()
+
 if __name__ == '__main__':
+    start_model_load()
     app.run(debug=True)
\ No newline at end of file
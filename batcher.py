@@ -0,0 +1,127 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List
+
+
+class QueueFullError(Exception):
+    pass
+
+
+# Queued by close(); everything queued before it is still scored
+_CLOSE = object()
+
+
+class MicroBatcher:
+    # Collects texts from every in-flight request and scores them together.
+    # A batch is flushed when it reaches max_batch_size or when the oldest
+    # queued text has waited max_wait_ms, whichever comes first.
+    def __init__(self, predict_fn: Callable[[List[str]], List[dict]],
+                 max_batch_size: int = 32, max_wait_ms: float = 10.0,
+                 max_queue_size: int = 1024):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_queue_size = max_queue_size
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._rejected = 0
+        self._last_batch_size = 0
+        self._closed = False
+        self._stopping = False
+        self._submit_lock = threading.Lock()
+
+        self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, text: str) -> Future:
+        future = Future()
+        try:
+            with self._submit_lock:
+                if self._closed:
+                    raise QueueFullError("Batch queue is closed")
+                self._queue.put_nowait((text, future, time.monotonic()))
+        except queue.Full:
+            with self._stats_lock:
+                self._rejected += 1
+            raise QueueFullError(f"Batch queue is full ({self.max_queue_size} pending texts)")
+        return future
+
+    def predict_many(self, texts: List[str], timeout: float = None) -> List[dict]:
+        futures = [self.submit(text) for text in texts]
+        return [future.result(timeout=timeout) for future in futures]
+
+    def close(self):
+        # Stops the worker once it has scored everything already queued
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_CLOSE)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "max_queue_size": self.max_queue_size,
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "items": self._items,
+                "rejected": self._rejected,
+                "last_batch_size": self._last_batch_size,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0,
+            }
+
+    def _collect_batch(self) -> list:
+        # Block for the first item, then keep pulling until the window closes
+        first = self._queue.get()
+        if first is _CLOSE:
+            self._stopping = True
+            return []
+        batch = [first]
+        # The window is measured from when the oldest text was submitted, so
+        # time spent queued behind the previous batch counts toward it
+        deadline = first[2] + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _CLOSE:
+                self._stopping = True
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while not self._stopping:
+            batch = self._collect_batch()
+            # Skip requests whose caller has already given up
+            batch = [(text, future) for text, future, _ in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                predictions = self.predict_fn([text for text, _ in batch])
+            except Exception as e:
+                logging.error(f"Batch prediction failed: {str(e)}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), prediction in zip(batch, predictions):
+                future.set_result(prediction)
+
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._last_batch_size = len(batch)
@@ -0,0 +1,248 @@
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Everything runs offline: the LLM is a local fake Ollama server and the
+# classifier is a tiny randomly initialised RoBERTa with a BPE vocabulary
+# trained on the bundled dataset, so nothing is downloaded.
+
+CONCURRENCY_LEVELS = [1, 4, 16]
+PAYLOAD_SIZES = [1, 5, 15]
+SAMPLE_ANSWERS = [
+    "I sleep fine most nights.",
+    "Not often.",
+    "Lately I have been feeling really drained and it is hard to get out of bed in the morning.",
+    "I used to enjoy playing guitar, but now even picking it up feels like too much effort.",
+    "Sometimes I feel lonely, especially on weekends when everyone else seems busy.",
+]
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    latency = 0.05
+
+    def reply_content(self, body):
+        return json.dumps({"depression_score": random.randint(1, 10), "notes": "fake assessment"})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        time.sleep(self.latency)
+        content = self.reply_content(body)
+        prompt_tokens = sum(len(m.get('content', '').split()) for m in body.get('messages', []))
+        payload = json.dumps({
+            "model": body.get('model', 'fake'),
+            "created_at": "1970-01-01T00:00:00Z",
+            "message": {"role": "assistant", "content": content},
+            "done": True,
+            "done_reason": "stop",
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(self.latency * 0.7e9),
+            "eval_count": len(content.split()),
+            "eval_duration": int(self.latency * 0.3e9),
+            "total_duration": int(self.latency * 1e9),
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_ollama(latency, handler_class=FakeOllamaHandler):
+    handler = type('Handler', (handler_class,), {'latency': latency})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def build_tiny_model(model_dir, corpus_file='depression_dataset.csv', vocab_size=2000, seed=0):
+    import torch
+    from tokenizers import ByteLevelBPETokenizer
+    from transformers import RobertaConfig, RobertaForSequenceClassification, RobertaTokenizer
+
+    with open(corpus_file, encoding='utf-8') as f:
+        corpus = f.read().splitlines()
+    bpe = ByteLevelBPETokenizer()
+    bpe.train_from_iterator(corpus, vocab_size=vocab_size,
+                            special_tokens=["<s>", "<pad>", "</s>", "<unk>", "<mask>"])
+    bpe.save_model(model_dir)
+    tokenizer = RobertaTokenizer(os.path.join(model_dir, 'vocab.json'), os.path.join(model_dir, 'merges.txt'))
+    tokenizer.save_pretrained(model_dir)
+
+    config = RobertaConfig(
+        vocab_size=tokenizer.vocab_size,
+        hidden_size=64,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=128,
+        max_position_embeddings=130,  # MAX_LENGTH + RoBERTa's padding offset
+        pad_token_id=tokenizer.pad_token_id,
+        num_labels=5,
+    )
+    torch.manual_seed(seed)
+    RobertaForSequenceClassification(config).save_pretrained(model_dir)
+
+
+def make_payload(size, answer_field):
+    return {
+        "user_type": "Student",
+        "responses": [
+            {
+                "question_number": i + 1,
+                "question_text": f"Benchmark question {i + 1}?",
+                # A random suffix keeps answers unique so the score cache doesn't hide the model cost
+                answer_field: f"{random.choice(SAMPLE_ANSWERS)} ({random.random():.8f})",
+            }
+            for i in range(size)
+        ]
+    }
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0
+    # Nearest-rank: the smallest value with at least pct% of values at or below it
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def serve_app(app):
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_endpoint(url, answer_field, concurrency, size, requests_per_level):
+    def call(_):
+        data = json.dumps(make_payload(size, answer_field)).encode('utf-8')
+        req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+        started = time.perf_counter()
+        with urllib.request.urlopen(req) as response:
+            response.read()
+        return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(call, range(requests_per_level)))
+    elapsed = time.perf_counter() - started
+    return {
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "requests_per_sec": round(len(latencies) / elapsed, 2),
+    }
+
+
+def bench_detector(detector, batch_sizes=(1, 16, 64), rounds=5):
+    results = {}
+    for batch_size in batch_sizes:
+        texts = [f"Question: Benchmark? Answer: {random.choice(SAMPLE_ANSWERS)}" for _ in range(batch_size)]
+        tokens = int(detector.preprocess_batch(texts)['attention_mask'].sum())
+        started = time.perf_counter()
+        for _ in range(rounds):
+            detector.predict_batch(texts)
+        elapsed = time.perf_counter() - started
+        results[f"batch_{batch_size}"] = {
+            "tokens_per_sec": round(tokens * rounds / elapsed, 1),
+            "texts_per_sec": round(batch_size * rounds / elapsed, 1),
+        }
+    return results
+
+
+def run_suite(llm_latency=0.05, requests_per_level=50, concurrency_levels=CONCURRENCY_LEVELS,
+              payload_sizes=PAYLOAD_SIZES):
+    fake_ollama = start_fake_ollama(llm_latency)
+    model_dir = tempfile.mkdtemp(prefix='bench_roberta_')
+    build_tiny_model(model_dir)
+
+    # Both apps read these at import time
+    os.environ['OLLAMA_HOST'] = f"http://127.0.0.1:{fake_ollama.server_address[1]}"
+    os.environ['MODEL_PATH'] = model_dir
+    os.environ['INFERENCE_ENGINE'] = 'torch'
+    os.environ['SCORE_CACHE_DB'] = ''
+    import back
+    import backend
+    backend.load_detector()
+
+    results = {"config": {
+        "llm_latency": llm_latency,
+        "requests_per_level": requests_per_level,
+        "python": sys.version.split()[0],
+    }}
+    for name, module, answer_field in [("back", back, "student_response"), ("backend", backend, "response_text")]:
+        server = serve_app(module.app)
+        url = f"http://127.0.0.1:{server.server_port}/assess_depression"
+        results[name] = {}
+        for size in payload_sizes:
+            for concurrency in concurrency_levels:
+                key = f"questions_{size}_concurrency_{concurrency}"
+                results[name][key] = bench_endpoint(url, answer_field, concurrency, size, requests_per_level)
+                print(f"{name} {key}: {results[name][key]}")
+        server.shutdown()
+
+    results["detector"] = bench_detector(backend.detector)
+    fake_ollama.shutdown()
+    return results
+
+
+def compare(current, baseline, tolerance):
+    # Latency metrics regress when they grow, throughput metrics when they shrink
+    regressions = []
+
+    def walk(cur, base, path):
+        for key, value in cur.items():
+            if key not in base or key == "config":
+                continue
+            if isinstance(value, dict):
+                walk(value, base[key], f"{path}{key}.")
+            elif isinstance(value, (int, float)) and base[key]:
+                change = (value - base[key]) / base[key]
+                worse = change > tolerance if key.endswith('_ms') else change < -tolerance
+                if worse:
+                    regressions.append({"metric": path + key, "baseline": base[key],
+                                        "current": value, "change": round(change, 4)})
+
+    walk(current, baseline, "")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline latency/throughput benchmark for both assessment services")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative change before flagging")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake Ollama latency per call, seconds")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=CONCURRENCY_LEVELS)
+    parser.add_argument("--payload-sizes", type=int, nargs="+", default=PAYLOAD_SIZES)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    results = run_suite(args.llm_latency, args.requests, args.concurrency, args.payload_sizes)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression['metric']}: {regression['baseline']} -> {regression['current']}"
+                  f" ({regression['change']:+.1%})")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline")
@@ -0,0 +1,130 @@
+import argparse
+import csv
+import multiprocessing
+import os
+import time
+
+import pandas as pd
+import torch
+
+from backend import DepressionDetector, MODEL_PATH, INFERENCE_ENGINE, StudentResponse, analysis_text, risk_level_for
+from convert_dataset import META_COLUMNS, LABEL_COLUMN, scale_to_level
+
+# Set in each worker process by init_worker
+worker_detector = None
+
+
+def init_worker(model_path, engine, threads_per_worker):
+    global worker_detector
+    torch.set_num_threads(threads_per_worker)
+    worker_detector = DepressionDetector(model_path, engine)
+
+
+def score_rows(task):
+    rows, question_columns = task
+    texts = [
+        analysis_text(StudentResponse(0, question, row[question]))
+        for row in rows
+        for question in question_columns
+    ]
+    predictions = worker_detector.predict_batch(texts)
+
+    results = []
+    for offset, row in enumerate(rows):
+        row_predictions = predictions[offset * len(question_columns):(offset + 1) * len(question_columns)]
+        scores = [p['depression_score'] for p in row_predictions]
+        mean_score = sum(scores) / len(scores) if scores else 0
+        result = {'s no': row['s no'], LABEL_COLUMN: row.get(LABEL_COLUMN, '')}
+        for question, prediction in zip(question_columns, row_predictions):
+            result[f"{question} score"] = prediction['depression_score']
+            result[f"{question} confidence"] = prediction['confidence']
+        result['mean_depression_score'] = round(mean_score, 2)
+        result['risk_level'] = risk_level_for(mean_score)
+        results.append(result)
+    return results
+
+
+def read_scored(output_file):
+    if not os.path.exists(output_file) or os.path.getsize(output_file) == 0:
+        return set()
+    return set(pd.read_csv(output_file, usecols=['s no'], dtype=str)['s no'])
+
+
+def iter_tasks(input_file, chunk_size, rows_per_task, skip):
+    for chunk in pd.read_csv(input_file, chunksize=chunk_size, dtype=str, keep_default_na=False):
+        question_columns = [c for c in chunk.columns if c not in META_COLUMNS and c != LABEL_COLUMN]
+        rows = [row for row in chunk.to_dict('records') if row['s no'] not in skip]
+        for start in range(0, len(rows), rows_per_task):
+            yield rows[start:start + rows_per_task], question_columns
+
+
+def bulk_score(input_file='depression_dataset.csv', output_file='depression_scores.csv',
+               workers=None, threads_per_worker=2, chunk_size=10000, rows_per_task=8,
+               model_path=MODEL_PATH, engine=INFERENCE_ENGINE):
+    workers = workers or max(1, (os.cpu_count() or 1) // threads_per_worker)
+    scored = read_scored(output_file)
+    if scored:
+        print(f"Resuming: {len(scored)} rows already in {output_file}")
+
+    started = time.time()
+    rows_done = 0
+    # Agreement with the 1-10 labels, mapped to 1-5 levels as in training
+    labelled = 0
+    exact_matches = 0
+    absolute_error = 0.0
+
+    # spawn keeps torch's thread pools out of the forked children
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers, initializer=init_worker,
+                      initargs=(model_path, engine, threads_per_worker)) as pool, \
+            open(output_file, 'a', newline='', encoding='utf-8') as file:
+        writer = None
+        tasks = iter_tasks(input_file, chunk_size, rows_per_task, scored)
+        # imap keeps output in input order while workers run ahead
+        for results in pool.imap(score_rows, tasks):
+            if writer is None:
+                writer = csv.DictWriter(file, fieldnames=list(results[0].keys()))
+                if not scored:
+                    writer.writeheader()
+            writer.writerows(results)
+            file.flush()
+
+            for result in results:
+                if str(result[LABEL_COLUMN]).strip():
+                    expected = scale_to_level(float(result[LABEL_COLUMN]))
+                    labelled += 1
+                    exact_matches += int(round(result['mean_depression_score']) == expected)
+                    absolute_error += abs(result['mean_depression_score'] - expected)
+
+            rows_done += len(results)
+            elapsed = time.time() - started
+            print(f"Scored {rows_done} rows ({rows_done / elapsed:.1f} rows/sec)")
+
+    elapsed = time.time() - started
+    report = {
+        "rows": rows_done,
+        "seconds": round(elapsed, 1),
+        "rows_per_sec": round(rows_done / elapsed, 2) if elapsed else 0,
+        "labelled_rows": labelled,
+        "label_agreement": round(exact_matches / labelled, 4) if labelled else None,
+        "mean_absolute_error": round(absolute_error / labelled, 4) if labelled else None,
+    }
+    print(f"Bulk scoring complete: {report}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a wide CSV dataset with the RoBERTa model, offline")
+    parser.add_argument("--input", default="depression_dataset.csv")
+    parser.add_argument("--output", default="depression_scores.csv",
+                        help="Appended to; rows whose 's no' is already present are skipped")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads-per-worker", type=int, default=2)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--rows-per-task", type=int, default=8)
+    parser.add_argument("--model-path", default=MODEL_PATH)
+    parser.add_argument("--engine", default=INFERENCE_ENGINE, choices=["torch", "int8", "onnx"])
+    args = parser.parse_args()
+
+    bulk_score(args.input, args.output, args.workers, args.threads_per_worker,
+               args.chunk_size, args.rows_per_task, args.model_path, args.engine)
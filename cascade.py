@@ -0,0 +1,143 @@
+from flask import Flask, Response, request, jsonify
+import logging
+import os
+import threading
+import time
+from typing import List
+
+import back
+import backend
+from metrics import Metrics, render_all
+
+app = Flask(__name__)
+logging.basicConfig(level=logging.INFO)
+
+# Answers the classifier is less sure about than this (in percent) go to the LLM
+CASCADE_CONFIDENCE_THRESHOLD = float(os.environ.get("CASCADE_CONFIDENCE_THRESHOLD", 60))
+# Classifier levels (1-5) that are always escalated, e.g. "3" for the moderate band
+CASCADE_ESCALATE_LEVELS = {
+    int(level) for level in os.environ.get("CASCADE_ESCALATE_LEVELS", "3").split(",") if level.strip()
+}
+
+
+def level_to_scale(level: int) -> float:
+    # Training maps the 1-10 scale to levels as ceil(scale / 2), so level L
+    # covers 2L-1..2L; use the middle of that band
+    return 2 * level - 0.5
+
+
+class CascadeStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.answers = 0
+        self.escalated = 0
+        self.llm_seconds = 0.0
+
+    def record(self, answers: int, escalated: int, llm_seconds: float):
+        with self._lock:
+            self.answers += answers
+            self.escalated += escalated
+            self.llm_seconds += llm_seconds
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            llm_seconds_per_answer = self.llm_seconds / self.escalated if self.escalated else 0
+            return {
+                "confidence_threshold": CASCADE_CONFIDENCE_THRESHOLD,
+                "escalate_levels": sorted(CASCADE_ESCALATE_LEVELS),
+                "answers": self.answers,
+                "escalated": self.escalated,
+                "escalation_rate": round(self.escalated / self.answers, 4) if self.answers else 0,
+                "llm_seconds": round(self.llm_seconds, 3),
+                # What the answers kept on the classifier would have cost on the LLM path
+                "estimated_llm_seconds_saved": round((self.answers - self.escalated) * llm_seconds_per_answer, 3),
+            }
+
+
+cascade_stats = CascadeStats()
+# Requests and errors of this app; the stages are recorded by back and backend
+metrics = Metrics("cascade")
+
+
+def needs_escalation(prediction: dict) -> bool:
+    return (prediction['confidence'] < CASCADE_CONFIDENCE_THRESHOLD
+            or prediction['depression_score'] in CASCADE_ESCALATE_LEVELS)
+
+
+def score_cascade(responses: List[back.QuestionResponse], mode: str = None) -> List[dict]:
+    with backend.lease_model() as current:
+        predictions = backend.predict_with_cache([
+            backend.StudentResponse(r.question_number, r.question_text, r.student_response)
+            for r in responses
+        ], current)
+
+    records = []
+    for response, prediction in zip(responses, predictions):
+        record = back.response_record(
+            response, level_to_scale(prediction['depression_score']), "Scored by the classifier",
+            prediction['confidence']
+        )
+        record["source"] = "classifier"
+        record["model_version"] = current.version
+        records.append(record)
+
+    escalated = [index for index, prediction in enumerate(predictions) if needs_escalation(prediction)]
+    started = time.perf_counter()
+    if escalated:
+        llm_scores = back.score_responses([responses[index] for index in escalated], mode=mode)
+        for index, (depression_score, notes) in zip(escalated, llm_scores):
+            # The classifier's confidence is kept only as the reason for escalating
+            records[index]["classifier_confidence"] = records[index].pop("confidence")
+            records[index].update({
+                "depression_score": float(depression_score),
+                "notes": notes,
+                "source": "llm"
+            })
+    cascade_stats.record(len(responses), len(escalated), time.perf_counter() - started if escalated else 0)
+    return records
+
+
+@app.route('/assess_depression', methods=['POST'])
+def assess_depression():
+    with metrics.track_request("assess_depression"):
+        return _assess_depression()
+
+
+def _assess_depression():
+    data = request.get_json()
+    responses = back.parse_responses(data)
+
+    try:
+        records = score_cascade(responses, mode=data.get('scoring_mode'))
+    except (backend.QueueFullError, backend.ModelNotReadyError, back.ScoringUnavailableError) as e:
+        logging.warning(f"Rejecting request: {str(e)}")
+        metrics.inc("rejected_total")
+        return jsonify({"error": str(e)}), 503
+
+    total_questions = len(responses)
+    overall_depression_scale = sum(r["depression_score"] for r in records) / total_questions if total_questions else 0
+    escalated = sum(1 for r in records if r["source"] == "llm")
+
+    return jsonify({
+        "responses": records,
+        "overall_depression_scale": overall_depression_scale,
+        "depression_status": back.depression_status_for(overall_depression_scale),
+        "escalation_rate": round(escalated / total_questions, 4) if total_questions else 0
+    })
+
+
+@app.route('/cascade_stats', methods=['GET'])
+def stats():
+    return jsonify(cascade_stats.as_dict())
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    gauges = {f"cascade_{key}": value for key, value in cascade_stats.as_dict().items()}
+    return Response(render_all([metrics, backend.metrics, back.metrics], gauges, backend.model_info()),
+                    mimetype='text/plain; version=0.0.4')
+
+
+if __name__ == '__main__':
+    backend.start_model_load()
+    app.run(debug=True)
@@ -0,0 +1,81 @@
+import argparse
+import math
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dataset_columns import META_COLUMNS, LABEL_COLUMN
+
+SCHEMA = pa.schema([
+    ('s no', pa.int64()),
+    ('question', pa.string()),
+    ('text', pa.string()),
+    ('depression_level', pa.int8()),
+])
+
+
+def scale_to_level(scale):
+    # 1-10 scale -> 1-5 classes: 1-2 -> 1, 3-4 -> 2, ..., 9-10 -> 5
+    return min(5, max(1, math.ceil(scale / 2)))
+
+
+def level_to_label(level):
+    # 1-5 level -> 0-4 class index of the num_labels=5 head; backend adds 1 back
+    return int(level) - 1
+
+
+def wide_to_long(chunk, question_columns):
+    chunk = chunk.dropna(subset=[LABEL_COLUMN])
+    long = chunk.melt(
+        id_vars=['s no', LABEL_COLUMN],
+        value_vars=question_columns,
+        var_name='question',
+        value_name='answer'
+    )
+    long = long.dropna(subset=['answer'])
+    long['answer'] = long['answer'].astype(str).str.strip()
+    long = long[(long['answer'] != '') & (long['answer'] != 'No response')]
+
+    # Same text layout backend.assess_depression builds at inference time
+    long['text'] = 'Question: ' + long['question'] + ' Answer: ' + long['answer']
+    long['depression_level'] = long[LABEL_COLUMN].astype(float).map(scale_to_level).astype('int8')
+    long['s no'] = long['s no'].astype('int64')
+    return long[['s no', 'question', 'text', 'depression_level']]
+
+
+def convert_dataset(input_file='depression_dataset.csv', output_file='training_data.parquet', chunk_size=50000):
+    start = time.time()
+    rows_in = 0
+    rows_out = 0
+    writer = None
+    try:
+        # Each chunk is converted and written before the next is read, so memory
+        # stays bounded by chunk_size regardless of the input size
+        for chunk in pd.read_csv(input_file, chunksize=chunk_size, dtype=str, keep_default_na=False, na_values=['']):
+            question_columns = [c for c in chunk.columns if c not in META_COLUMNS and c != LABEL_COLUMN]
+            long = wide_to_long(chunk, question_columns)
+            if writer is None:
+                writer = pq.ParquetWriter(output_file, SCHEMA, compression='zstd')
+            writer.write_table(pa.Table.from_pandas(long, schema=SCHEMA, preserve_index=False))
+
+            rows_in += len(chunk)
+            rows_out += len(long)
+            print(f"Converted {rows_in} wide rows into {rows_out} training rows")
+    finally:
+        if writer is not None:
+            writer.close()
+
+    print(f"Wrote {rows_out} rows to {output_file} in {time.time() - start:.1f}s")
+    return rows_out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the wide generated dataset into the training format")
+    parser.add_argument("--input", default="depression_dataset.csv")
+    parser.add_argument("--output", default="training_data.parquet")
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    args = parser.parse_args()
+
+    convert_dataset(args.input, args.output, args.chunk_size)
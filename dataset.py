@@ -1,8 +1,15 @@
+import argparse
 import csv
+import json
+import os
+import re
 import ollama
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 import time
+from dataset_columns import META_COLUMNS, LABEL_COLUMN
 
 # Depression assessment questions
 questions = [
@@ -18,6 +25,26 @@ questions = [
     "Are you having trouble handling daily responsibilities?"
 ]
 
+# Define CSV headers
+headers = META_COLUMNS + questions + [LABEL_COLUMN]
+
+class RateLimiter:
+    # Spaces calls evenly so all workers together stay under max_per_second
+    def __init__(self, max_per_second):
+        self.interval = 1.0 / max_per_second if max_per_second else 0
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
 def get_ollama_response(question):
     system_prompt = """You are simulating a student responding to mental health assessment questions. 
                     Provide a realistic response in 1-2 sentences, as if you were a student potentially experiencing depression. 
@@ -37,65 +64,166 @@ def get_ollama_response(question):
         print(f"❌ Error processing response: {str(e)}")
         return "No response"
 
+def extract_json_object(text):
+    # Tolerate prose or code fences around the JSON object
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if not match:
+        return {}
+    try:
+        data = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def get_ollama_responses(question_list, rate_limiter=None):
+    # One call per synthetic student, so all answers come from the same persona
+    numbered = "\n".join(f"q{index}: {question}" for index, question in enumerate(question_list, start=1))
+    system_prompt = f"""You are simulating a single student responding to a mental health assessment.
+                    Invent one consistent student, potentially experiencing depression, and answer every question below as that student.
+                    Provide a realistic response in 1-2 sentences per question. Keep your answers brief and direct.
+
+                    {numbered}
+
+                    Reply with a JSON object only, mapping each question key to the answer, for example:
+                    {{"q1": "<answer>", "q2": "<answer>"}}
+                    """
+    print(f"🧠 Sending {len(question_list)} questions to Ollama in one call")
+    try:
+        response = ollama.chat(model='llama3.2', format='json', messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": "Answer all questions."}
+        ])
+        data = extract_json_object(response['message']['content'])
+    except Exception as e:
+        print(f"❌ Error processing response: {str(e)}")
+        data = {}
+
+    answers = {}
+    for index, question in enumerate(question_list, start=1):
+        # Accept "q1", "1" or the question text itself as the key
+        answer = data.get(f"q{index}", data.get(str(index), data.get(question)))
+        if isinstance(answer, str) and answer.strip():
+            answers[question] = answer.strip()
+
+    missing = [question for question in question_list if question not in answers]
+    if missing:
+        print(f"🔁 Repairing {len(missing)} missing answers with per-question calls")
+        for question in missing:
+            if rate_limiter:
+                rate_limiter.wait()
+            answers[question] = get_ollama_response(question)
+
+    return answers
+
 def generate_dataset(num_samples=100, output_file='depression_dataset.csv'):
-    print(f"📂 Preparing to generate dataset with {num_samples} samples...")
-    
-    # Define CSV headers
-    headers = [
-        's no',
-        'age',
-        'gender'
-    ] + questions + ["scale of 1 to 10"]
-
-    print(f"📝 Opening file '{output_file}' for writing...")
-    with open(output_file, 'w', newline='', encoding='utf-8') as file:
+    # Kept for existing callers; one worker through the resumable generator,
+    # so a rerun after a crash continues instead of truncating the file
+    generate_dataset_parallel(num_samples, output_file, workers=1)
+
+def generate_row(sample_number, rate_limiter=None, batch_answers=False):
+    row = {
+        's no': sample_number,
+        'age': random.randint(17, 21),
+        'gender': random.choice(['M', 'F'])
+    }
+    if batch_answers:
+        if rate_limiter:
+            rate_limiter.wait()
+        row.update(get_ollama_responses(questions, rate_limiter))
+    else:
+        for question in questions:
+            if rate_limiter:
+                rate_limiter.wait()
+            row[question] = get_ollama_response(question)
+    row["scale of 1 to 10"] = random.randint(1, 10)
+    return row
+
+def recover_completed_samples(output_file):
+    if not os.path.exists(output_file) or os.path.getsize(output_file) == 0:
+        return set()
+
+    with open(output_file, newline='', encoding='utf-8') as file:
+        rows = list(csv.DictReader(file))
+    with open(output_file, 'rb') as file:
+        file.seek(-1, os.SEEK_END)
+        ends_with_newline = file.read(1) == b'\n'
+
+    # A row cut off by a crash has no label yet, so it gets dropped and regenerated.
+    # Without its line ending the label itself may be cut short ("10" -> "1"),
+    # and the next append would be glued onto the same line, so that row goes too.
+    complete = rows if ends_with_newline else rows[:-1]
+    complete = [
+        row for row in complete
+        if (row.get('s no') or '').strip().isdigit() and (row.get("scale of 1 to 10") or '').strip()
+    ]
+    if len(complete) != len(rows) or not ends_with_newline:
+        print(f"⚠️ Dropping {len(rows) - len(complete)} incomplete rows from '{output_file}'")
+        temp_file = output_file + '.tmp'
+        with open(temp_file, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=headers)
+            writer.writeheader()
+            writer.writerows({key: row.get(key) for key in headers} for row in complete)
+        os.replace(temp_file, output_file)
+
+    return {int(row['s no']) for row in complete}
+
+def generate_dataset_parallel(num_samples=100, output_file='depression_dataset.csv',
+                              workers=8, max_requests_per_second=None, flush_every=10,
+                              batch_answers=False):
+    # Rows are generated concurrently and appended as soon as they finish, so
+    # the file is not in 's no' order. Rerunning resumes from what is on disk.
+    completed = recover_completed_samples(output_file)
+    pending = [n for n in range(1, num_samples + 1) if n not in completed]
+    print(f"📂 {len(completed)} samples already in '{output_file}', {len(pending)} to generate with {workers} workers...")
+    if not pending:
+        return
+
+    rate_limiter = RateLimiter(max_requests_per_second)
+    has_content = os.path.exists(output_file) and os.path.getsize(output_file) > 0
+
+    with open(output_file, 'a', newline='', encoding='utf-8') as file:
         writer = csv.DictWriter(file, fieldnames=headers)
-        writer.writeheader()
-        print("✅ CSV file initialized with headers.")
-
-        for i in range(num_samples):
-            print(f"\n➡️ Processing sample {i+1}/{num_samples}")
-
-            # Generate demographic data
-            age = random.randint(17, 21)
-            gender = random.choice(['M', 'F'])
-            
-            print(f"👤 Generated demographic data - Age: {age}, Gender: {gender}")
-            
-            # Write initial data
-            row = {
-                's no': i + 1,
-                'age': age,
-                'gender': gender
-            }
-            
-            # For each question, get a response and write it directly to the CSV row
-            for index, question in enumerate(questions):
-                print(f"📝 Question {index+1}/{len(questions)}: '{question}'")
-                response = get_ollama_response(question)
-                row[question] = response
-            
-            # Generate a random depression level rating between 1 and 10
-            depression_scale = random.randint(1, 10)
-            row["scale of 1 to 10"] = depression_scale
-            print(f"📊 Generated depression scale: {depression_scale}")
-
-            # Write the row to the CSV file
-            try:
-                writer.writerow(row)
-                print(f"✅ Sample {i+1} successfully written to CSV")
-            except Exception as e:
-                print(f"❌ Error writing sample {i+1} to CSV: {str(e)}")
-            
-            # Add a small delay to avoid overwhelming the API
-            # time.sleep(1)
+        if not has_content:
+            writer.writeheader()
+
+        written = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(generate_row, n, rate_limiter, batch_answers): n for n in pending}
+            for future in as_completed(futures):
+                sample_number = futures[future]
+                try:
+                    writer.writerow(future.result())
+                except Exception as e:
+                    print(f"❌ Error generating sample {sample_number}: {str(e)}")
+                    continue
+
+                written += 1
+                if written % flush_every == 0:
+                    file.flush()
+                    os.fsync(file.fileno())
+                    print(f"💾 {written}/{len(pending)} samples written")
 
     print(f"\n✨ Dataset generation complete! File saved as: {output_file}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic depression assessment dataset")
+    parser.add_argument("--num-samples", type=int, default=300)
+    parser.add_argument("--output", default="depression_dataset.csv")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Concurrent rows; every run resumes from the rows already in --output")
+    parser.add_argument("--rate-limit", type=float, default=None,
+                        help="Maximum Ollama requests per second across all workers")
+    parser.add_argument("--flush-every", type=int, default=10)
+    parser.add_argument("--batch-answers", action="store_true",
+                        help="Ask for all answers of one student in a single call")
+    args = parser.parse_args()
+
     print("🔄 Initializing Depression Dataset Generator...")
     start_time = datetime.now()
-    generate_dataset(num_samples=300)
+    generate_dataset_parallel(args.num_samples, args.output, workers=args.workers,
+                              max_requests_per_second=args.rate_limit,
+                              flush_every=args.flush_every,
+                              batch_answers=args.batch_answers)
     end_time = datetime.now()
     print(f"⏰ Time taken for dataset generation: {end_time - start_time}")
     print("🚀 Process completed!")
@@ -0,0 +1,6 @@
+# Column layout of the wide CSV written by dataset.py. Kept free of heavy
+# imports so the serving paths can share it with the offline tools.
+
+# Columns that are not questions, apart from the label
+META_COLUMNS = ['s no', 'age', 'gender']
+LABEL_COLUMN = "scale of 1 to 10"
@@ -0,0 +1,136 @@
+import argparse
+import json
+import os
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from convert_dataset import META_COLUMNS, LABEL_COLUMN, SCHEMA, scale_to_level, wide_to_long
+
+# Training rows plus the teacher's raw 1-10 score, which the student is
+# trained against as a soft target (see training.DistillationTrainer)
+TEACHER_SCHEMA = SCHEMA.append(pa.field('teacher_score', pa.float32()))
+# Respondents whose 's no' falls in this bucket are held out for the agreement report
+HOLDOUT_MODULO = 10
+
+
+def label_with_teacher(long, back, batch_size=256):
+    # Scores every answer with the LLM path of back.py. Calls run on its
+    # shared pool and go through its score cache, so with SCORE_CACHE_DB set
+    # a rerun only pays for answers it has not seen before.
+    scores = []
+    for start in range(0, len(long), batch_size):
+        batch = long.iloc[start:start + batch_size]
+        responses = [
+            back.QuestionResponse(0, question, text.split(' Answer: ', 1)[-1])
+            for question, text in zip(batch['question'], batch['text'])
+        ]
+        scores.extend(back.score_responses(responses, mode="per_question"))
+
+    long = long.assign(
+        teacher_score=[float(score) for score, _ in scores],
+        teacher_ok=[notes != back.FALLBACK_NOTES for _, notes in scores]
+    )
+    # Failed calls come back as the fallback score; don't teach the student that
+    long = long[long['teacher_ok']].drop(columns=['teacher_ok'])
+    long['depression_level'] = long['teacher_score'].map(scale_to_level).astype('int8')
+    long['teacher_score'] = long['teacher_score'].astype('float32')
+    return long
+
+
+def label_dataset(input_file, train_file, holdout_file, chunk_size=2000):
+    # Imported here so SCORE_CACHE_DB and the LLM settings can be set first
+    import back
+
+    started = time.time()
+    counts = {"answers": 0, "labelled": 0, "train": 0, "holdout": 0}
+    writers = {}
+    try:
+        for chunk in pd.read_csv(input_file, chunksize=chunk_size, dtype=str, keep_default_na=False, na_values=['']):
+            question_columns = [c for c in chunk.columns if c not in META_COLUMNS and c != LABEL_COLUMN]
+            long = wide_to_long(chunk, question_columns)
+            labelled = label_with_teacher(long, back)
+
+            holdout = labelled['s no'] % HOLDOUT_MODULO == 0
+            for split, path, rows in [("train", train_file, labelled[~holdout]),
+                                      ("holdout", holdout_file, labelled[holdout])]:
+                if split not in writers:
+                    writers[split] = pq.ParquetWriter(path, TEACHER_SCHEMA, compression='zstd')
+                writers[split].write_table(pa.Table.from_pandas(rows, schema=TEACHER_SCHEMA, preserve_index=False))
+                counts[split] += len(rows)
+
+            counts["answers"] += len(long)
+            counts["labelled"] += len(labelled)
+            print(f"Teacher scored {counts['labelled']}/{counts['answers']} answers "
+                  f"({counts['answers'] / (time.time() - started):.1f} answers/sec)")
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    counts["cache"] = back.score_cache.stats()
+    return counts
+
+
+def teacher_agreement(model_path, holdout_file, engine="torch", batch_size=64):
+    # How closely the student reproduces the teacher on respondents it never saw
+    from backend import DepressionDetector
+
+    detector = DepressionDetector(model_path, engine)
+    holdout = pd.read_parquet(holdout_file, columns=['text', 'teacher_score'])
+    texts = holdout['text'].tolist()
+    expected = holdout['teacher_score'].map(scale_to_level).tolist()
+
+    predicted = []
+    started = time.time()
+    for start in range(0, len(texts), batch_size):
+        predicted.extend(p['depression_score'] for p in detector.predict_batch(texts[start:start + batch_size]))
+    elapsed = time.time() - started
+
+    pairs = list(zip(predicted, expected))
+    return {
+        "holdout_answers": len(pairs),
+        "exact_agreement": round(sum(p == e for p, e in pairs) / len(pairs), 4) if pairs else None,
+        "within_one_level": round(sum(abs(p - e) <= 1 for p, e in pairs) / len(pairs), 4) if pairs else None,
+        "mean_absolute_error": round(sum(abs(p - e) for p, e in pairs) / len(pairs), 4) if pairs else None,
+        "student_ms_per_answer": round(elapsed * 1000 / len(pairs), 3) if pairs else None,
+    }
+
+
+def distill(input_file='depression_dataset.csv', output_dir='models/depression_roberta_distilled',
+            train_file='distill_train.parquet', holdout_file='distill_holdout.parquet',
+            base_model='distilroberta-base', profile='default', skip_labelling=False):
+    if not skip_labelling:
+        counts = label_dataset(input_file, train_file, holdout_file)
+        print(f"Labelling complete: {json.dumps(counts)}")
+
+    from training import train_depression_model
+    train_depression_model(train_file, output_dir, profile=profile, base_model=base_model,
+                           teacher_column='teacher_score')
+
+    report = teacher_agreement(output_dir, holdout_file)
+    print(f"Agreement with the teacher: {json.dumps(report)}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distil the LLM scorer of back.py into the RoBERTa classifier")
+    parser.add_argument("--input", default="depression_dataset.csv", help="Wide CSV written by dataset.py")
+    parser.add_argument("--output-dir", default="models/depression_roberta_distilled")
+    parser.add_argument("--train-file", default="distill_train.parquet")
+    parser.add_argument("--holdout-file", default="distill_holdout.parquet")
+    parser.add_argument("--base-model", default="distilroberta-base",
+                        help="Student checkpoint; roberta-base for the full-size model")
+    parser.add_argument("--profile", choices=["default", "cpu"], default="default")
+    parser.add_argument("--cache-db", default="teacher_scores.db",
+                        help="SQLite score cache shared with back.py, so reruns skip scored answers")
+    parser.add_argument("--skip-labelling", action="store_true",
+                        help="Reuse the train/holdout files from an earlier run")
+    args = parser.parse_args()
+
+    # back.py reads these at import time
+    os.environ.setdefault('SCORE_CACHE_DB', args.cache_db)
+    os.environ.setdefault('LLM_STRUCTURED_OUTPUT', '1')
+    distill(args.input, args.output_dir, args.train_file, args.holdout_file,
+            args.base_model, args.profile, args.skip_labelling)
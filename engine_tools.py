@@ -0,0 +1,126 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+from transformers import RobertaTokenizer, RobertaForSequenceClassification
+
+from backend import DepressionDetector, MODEL_PATH, ONNX_FILENAME
+
+ENGINES = ["torch", "int8", "onnx"]
+
+
+def export_onnx(model_path=MODEL_PATH, opset=14):
+    tokenizer = RobertaTokenizer.from_pretrained(model_path)
+    model = RobertaForSequenceClassification.from_pretrained(model_path, num_labels=5)
+    model.eval()
+
+    dummy = tokenizer(["Question: How are you? Answer: Fine."], return_tensors='pt')
+    output_file = os.path.join(model_path, ONNX_FILENAME)
+    torch.onnx.export(
+        model,
+        (dummy['input_ids'], dummy['attention_mask']),
+        output_file,
+        input_names=['input_ids', 'attention_mask'],
+        output_names=['logits'],
+        # Batch size and sequence length stay dynamic so padding='longest' works
+        dynamic_axes={
+            'input_ids': {0: 'batch', 1: 'sequence'},
+            'attention_mask': {0: 'batch', 1: 'sequence'},
+            'logits': {0: 'batch'}
+        },
+        opset_version=opset
+    )
+    print(f"Exported ONNX model to {output_file}")
+    return output_file
+
+
+def load_texts(path, limit=None):
+    if path.endswith('.parquet'):
+        df = pd.read_parquet(path, columns=['text'])
+    else:
+        df = pd.read_csv(path, usecols=['text'])
+    texts = df['text'].astype(str).tolist()
+    return texts[:limit] if limit else texts
+
+
+def run_engine(detector, texts, batch_size):
+    predictions = []
+    latencies = []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        began = time.perf_counter()
+        predictions.extend(detector.predict_batch(batch))
+        latencies.append((time.perf_counter() - began) * 1000)
+    return predictions, latencies
+
+
+def compare_engines(texts, engines=ENGINES, model_path=MODEL_PATH, batch_size=16,
+                    max_disagreement=0.02, max_confidence_drift=5.0):
+    # fp32 PyTorch is the reference every other engine is measured against
+    reference, reference_latencies = run_engine(DepressionDetector(model_path, "torch"), texts, batch_size)
+    reference_scores = np.array([p['depression_score'] for p in reference])
+    reference_confidences = np.array([p['confidence'] for p in reference])
+
+    report = {}
+    for engine in engines:
+        if engine == "torch":
+            predictions, latencies = reference, reference_latencies
+        else:
+            predictions, latencies = run_engine(DepressionDetector(model_path, engine), texts, batch_size)
+
+        scores = np.array([p['depression_score'] for p in predictions])
+        drift = np.abs(np.array([p['confidence'] for p in predictions]) - reference_confidences)
+        agreement = float((scores == reference_scores).mean()) if len(texts) else 1.0
+        report[engine] = {
+            "label_agreement": round(agreement, 4),
+            "mean_confidence_drift": round(float(drift.mean()), 3) if len(texts) else 0,
+            "max_confidence_drift": round(float(drift.max()), 3) if len(texts) else 0,
+            "p50_batch_ms": round(float(np.percentile(latencies, 50)), 2),
+            "p95_batch_ms": round(float(np.percentile(latencies, 95)), 2),
+            "texts_per_sec": round(len(texts) / (sum(latencies) / 1000), 1),
+        }
+        report[engine]["within_tolerance"] = (
+            1 - agreement <= max_disagreement
+            and report[engine]["max_confidence_drift"] <= max_confidence_drift
+        )
+
+    candidates = [engine for engine in engines if report[engine]["within_tolerance"]]
+    fastest = max(candidates, key=lambda engine: report[engine]["texts_per_sec"]) if candidates else "torch"
+    return {"engines": report, "recommended": fastest, "texts": len(texts), "batch_size": batch_size}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export and compare DepressionDetector inference engines")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export the model to ONNX next to its weights")
+    export_parser.add_argument("--model-path", default=MODEL_PATH)
+    export_parser.add_argument("--opset", type=int, default=14)
+
+    compare_parser = subparsers.add_parser("compare", help="Parity and latency of each engine against fp32")
+    compare_parser.add_argument("--data", required=True, help="Held-out CSV or Parquet file with a 'text' column")
+    compare_parser.add_argument("--model-path", default=MODEL_PATH)
+    compare_parser.add_argument("--engines", nargs="+", default=ENGINES, choices=ENGINES)
+    compare_parser.add_argument("--limit", type=int, default=1000)
+    compare_parser.add_argument("--batch-size", type=int, default=16)
+    compare_parser.add_argument("--max-disagreement", type=float, default=0.02)
+    compare_parser.add_argument("--max-confidence-drift", type=float, default=5.0,
+                                help="In confidence percentage points")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_onnx(args.model_path, args.opset)
+    else:
+        result = compare_engines(
+            load_texts(args.data, args.limit),
+            engines=args.engines,
+            model_path=args.model_path,
+            batch_size=args.batch_size,
+            max_disagreement=args.max_disagreement,
+            max_confidence_drift=args.max_confidence_drift
+        )
+        print(json.dumps(result, indent=2))
@@ -103,53 +103,75 @@ progress_bar.progress(progress / 100)
 all_answered = all(resp["student_response"].strip() != "" for resp in responses)
 if all_answered:
     if st.button("Submit Assessment"):
-        with st.spinner('Analyzing your responses, please wait...'):
-            backend_url = "http://localhost:5000/assess_depression"
-            payload = {
-                "user_type": user_type,
-                "responses": responses
-            }
-            response = requests.post(backend_url, json=payload)
-
-            if response.status_code == 200:
-                result = response.json()
-                
-                # Display results
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.metric("Overall Depression Risk Score", f"{result['overall_depression_scale']:.2f}/10")
-                    
-                with col2:
-                    status_color = {
-                        "High depression risk": "🔴",
-                        "Moderate depression risk": "🟡",
-                        "Low depression risk": "🟢"
-                    }
-                    st.write(f"Status: {status_color.get(result['depression_status'], '')} {result['depression_status']}")
-                
-                # Show detailed breakdown
-                st.subheader("Detailed Assessment")
-                
-                # Create three columns for different categories
-                col1, col2, col3 = st.columns(3)
-                
-                with col1:
-                    st.write("**Emotional Health Indicators**")
-                    for resp in result["responses"][:len(questions['emotional'])]:
-                        st.write(f"- Question {resp['question_number']}: {resp['depression_score']}/10")
-                        
-                with col2:
-                    st.write("**Academic Performance Indicators**")
-                    for resp in result["responses"][len(questions['emotional']):len(questions['emotional'])+len(questions['academic'])]:
-                        st.write(f"- Question {resp['question_number']}: {resp['depression_score']}/10")
-                        
-                with col3:
-                    st.write("**Social Integration Indicators**")
-                    for resp in result["responses"][len(questions['emotional'])+len(questions['academic']):]:
-                        st.write(f"- Question {resp['question_number']}: {resp['depression_score']}/10")
-
-            else:
-                st.error("Error: Unable to process your responses. Please try again later.")
+        backend_url = "http://localhost:5000/assess_depression/stream"
+        payload = {
+            "user_type": user_type,
+            "responses": responses
+        }
+
+        # Lay out the result area up front so scores can fill in as they arrive
+        summary_col1, summary_col2 = st.columns(2)
+        overall_placeholder = summary_col1.empty()
+        status_placeholder = summary_col2.empty()
+        overall_placeholder.info("Analyzing your responses, scores will appear as they are ready...")
+
+        st.subheader("Detailed Assessment")
+        categories = [
+            ("emotional", "**Emotional Health Indicators**"),
+            ("academic", "**Academic Performance Indicators**"),
+            ("social", "**Social Integration Indicators**")
+        ]
+        placeholders = []
+        for column, (category, title) in zip(st.columns(3), categories):
+            with column:
+                st.write(title)
+                for resp in responses[len(placeholders):len(placeholders) + len(questions[category])]:
+                    placeholder = st.empty()
+                    placeholder.write(f"- Question {resp['question_number']}: ⏳")
+                    placeholders.append(placeholder)
+
+        status_color = {
+            "High depression risk": "🔴",
+            "Moderate depression risk": "🟡",
+            "Low depression risk": "🟢"
+        }
+
+        scored = set()
+        try:
+            with requests.post(backend_url, json=payload, stream=True) as response:
+                if response.status_code != 200:
+                    raise requests.RequestException(f"status {response.status_code}")
+
+                summarized = False
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    record = json.loads(line)
+
+                    if record["type"] == "response":
+                        placeholders[record["index"]].write(
+                            f"- Question {record['question_number']}: {record['depression_score']}/10"
+                        )
+                        scored.add(record["index"])
+                    elif record["type"] == "summary":
+                        overall_placeholder.metric(
+                            "Overall Depression Risk Score", f"{record['overall_depression_scale']:.2f}/10"
+                        )
+                        status_placeholder.write(
+                            f"Status: {status_color.get(record['depression_status'], '')} {record['depression_status']}"
+                        )
+                        summarized = True
+                    elif record["type"] == "error":
+                        raise ValueError(record.get("error", "assessment failed"))
+
+                # A stream cut off before its summary is a failed assessment too
+                if not summarized:
+                    raise ValueError("stream ended without a summary")
+        except (requests.RequestException, ValueError, KeyError, IndexError):
+            overall_placeholder.empty()
+            for index, placeholder in enumerate(placeholders):
+                if index not in scored:
+                    placeholder.write(f"- Question {responses[index]['question_number']}: ⚠️")
+            st.error("Error: Unable to process your responses. Please try again later.")
 else:
     st.warning("Please answer all questions to submit the assessment.")
@@ -0,0 +1,174 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Fraction of requests whose per-stage timing breakdown is logged as JSON
+METRICS_SAMPLE_RATE = float(os.environ.get("METRICS_SAMPLE_RATE", 0.01))
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# For histograms of counts such as generated tokens
+COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+
+# Breakdown of the request being handled; copied into pool threads with
+# contextvars.copy_context() so their stages are attributed to it too
+_current_breakdown = contextvars.ContextVar("request_breakdown", default=None)
+
+
+class RequestBreakdown:
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "endpoint": self.endpoint,
+                "total_ms": round((time.perf_counter() - self.started) * 1000, 3),
+                "stages_ms": {stage: round(seconds * 1000, 3) for stage, seconds in self.stages.items()},
+            }
+
+
+class Metrics:
+    # Minimal Prometheus text-format registry: one histogram of stage
+    # durations labelled by stage, plus plain counters
+    def __init__(self, app_name):
+        self.app_name = app_name
+        self._lock = threading.Lock()
+        self._stage_buckets = {}
+        self._stage_sums = {}
+        self._stage_counts = {}
+        self._counters = {}
+        self._count_buckets = {}
+        self._count_sums = {}
+        self._count_totals = {}
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            buckets = self._stage_buckets.setdefault(stage, [0] * len(STAGE_BUCKETS))
+            for i, bound in enumerate(STAGE_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            self._stage_sums[stage] = self._stage_sums.get(stage, 0.0) + seconds
+            self._stage_counts[stage] = self._stage_counts.get(stage, 0) + 1
+
+        breakdown = _current_breakdown.get()
+        if breakdown is not None:
+            breakdown.add(stage, seconds)
+
+    def observe_count(self, name, value):
+        # Own histogram per name, kept out of the stage timings and breakdowns
+        with self._lock:
+            buckets = self._count_buckets.setdefault(name, [0] * len(COUNT_BUCKETS))
+            for i, bound in enumerate(COUNT_BUCKETS):
+                if value <= bound:
+                    buckets[i] += 1
+            self._count_sums[name] = self._count_sums.get(name, 0) + value
+            self._count_totals[name] = self._count_totals.get(name, 0) + 1
+
+    def inc(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    @contextmanager
+    def time_stage(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    @contextmanager
+    def track_request(self, endpoint):
+        breakdown = RequestBreakdown(endpoint)
+        token = _current_breakdown.set(breakdown)
+        self.inc("requests_total")
+        try:
+            yield breakdown
+        except Exception:
+            self.inc("errors_total")
+            raise
+        finally:
+            _current_breakdown.reset(token)
+            self.observe("request_total", time.perf_counter() - breakdown.started)
+            if random.random() < METRICS_SAMPLE_RATE:
+                logging.info(json.dumps({"app": self.app_name, "request_timing": breakdown.as_dict()}))
+
+    def render(self, gauges=None, info=None):
+        # gauges: extra {name: value} pairs, e.g. cache or batcher stats
+        return render_all([self], gauges, info)
+
+
+def render_all(registries, gauges=None, info=None):
+    # Several registries (e.g. both backends in one process) share metric
+    # families, so each family's HELP/TYPE header is written once
+    lines = [
+        "# HELP assessment_stage_seconds Time spent in each assessment stage.",
+        "# TYPE assessment_stage_seconds histogram",
+    ]
+    counters = {}
+    count_histograms = {}
+    for registry in registries:
+        app = registry.app_name
+        with registry._lock:
+            for stage in sorted(registry._stage_buckets):
+                labels = f'app="{app}",stage="{stage}"'
+                for bound, count in zip(STAGE_BUCKETS, registry._stage_buckets[stage]):
+                    lines.append(f'assessment_stage_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'assessment_stage_seconds_bucket{{{labels},le="+Inf"}} {registry._stage_counts[stage]}')
+                lines.append(f'assessment_stage_seconds_sum{{{labels}}} {registry._stage_sums[stage]}')
+                lines.append(f'assessment_stage_seconds_count{{{labels}}} {registry._stage_counts[stage]}')
+            for name, value in registry._counters.items():
+                counters.setdefault(name, []).append((app, value))
+            for name, buckets in registry._count_buckets.items():
+                count_histograms.setdefault(name, []).append(
+                    (app, list(buckets), registry._count_sums[name], registry._count_totals[name])
+                )
+
+    for name in sorted(count_histograms):
+        lines.append(f"# TYPE assessment_{name} histogram")
+        for app, buckets, total, count in count_histograms[name]:
+            for bound, bucket_count in zip(COUNT_BUCKETS, buckets):
+                lines.append(f'assessment_{name}_bucket{{app="{app}",le="{bound}"}} {bucket_count}')
+            lines.append(f'assessment_{name}_bucket{{app="{app}",le="+Inf"}} {count}')
+            lines.append(f'assessment_{name}_sum{{app="{app}"}} {total}')
+            lines.append(f'assessment_{name}_count{{app="{app}"}} {count}')
+
+    for name in sorted(counters):
+        lines.append(f"# TYPE assessment_{name} counter")
+        for app, value in counters[name]:
+            lines.append(f'assessment_{name}{{app="{app}"}} {value}')
+
+    gauge_app = registries[0].app_name if registries else ""
+    for name, value in sorted((gauges or {}).items()):
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, (int, float)):
+            lines.append(f"# TYPE assessment_{name} gauge")
+            lines.append(f'assessment_{name}{{app="{gauge_app}"}} {value}')
+
+    # info: {name: {label: value}} for string values such as the model
+    # version, written as labels on a constant 1; an "app" label overrides
+    # the default, e.g. for the backend's model when rendered by cascade.py
+    for name, labels in sorted((info or {}).items()):
+        labels = {"app": gauge_app, **labels}
+        label_text = ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+        lines.append(f"# TYPE assessment_{name} gauge")
+        lines.append(f'assessment_{name}{{{label_text}}} 1')
+
+    return "\n".join(lines) + "\n"
+
+
+def copy_request_context():
+    # Use as pool.submit(copy_request_context().run, fn, *args) so stages timed
+    # in the worker thread count toward the submitting request
+    return contextvars.copy_context()
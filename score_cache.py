@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+SCORE_CACHE_SIZE = int(os.environ.get("SCORE_CACHE_SIZE", 10000))
+SCORE_CACHE_TTL = float(os.environ.get("SCORE_CACHE_TTL", 7 * 24 * 3600))
+# Leave empty to keep the cache in memory only
+SCORE_CACHE_DB = os.environ.get("SCORE_CACHE_DB", "")
+# Expired rows are swept from the SQLite file once every this many writes
+SCORE_CACHE_SWEEP_EVERY = 1000
+
+
+def normalize_answer(text: str) -> str:
+    return re.sub(r"\s+", " ", text or "").strip().lower()
+
+
+def make_key(model_id: str, prompt_version: str, question_text: str, answer_text: str) -> str:
+    payload = "\x1f".join([model_id, prompt_version, (question_text or "").strip(), normalize_answer(answer_text)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ScoreCache:
+    # Two tiers: an in-memory LRU bounded by size and TTL, and an optional
+    # SQLite file (WAL mode) so scores survive restarts. Values are the
+    # stored score dicts, e.g. {"depression_score": 3, "notes": "..."}.
+    def __init__(self, max_size: int = SCORE_CACHE_SIZE, ttl: float = SCORE_CACHE_TTL,
+                 db_path: str = SCORE_CACHE_DB):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.db_path = db_path
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.persistent_hits = 0
+
+        # Opened on first use and re-opened after a fork: a connection must not
+        # be shared with the pre-forked workers of serve.py
+        self._db = None
+        self._db_pid = None
+        self._writes = 0
+
+    def _connection(self):
+        # Called with self._lock held
+        if not self.db_path:
+            return None
+        if self._db is None or self._db_pid != os.getpid():
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db_pid = os.getpid()
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS scores ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+        return self._db
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created, value = entry
+                if now - created <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(value)
+                del self._entries[key]
+                self.evictions += 1
+
+            db = self._connection()
+            if db is not None:
+                row = db.execute(
+                    "SELECT value, created FROM scores WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[1] <= self.ttl:
+                    value = json.loads(row[0])
+                    self._remember(key, row[1], value)
+                    self.hits += 1
+                    self.persistent_hits += 1
+                    return dict(value)
+                if row is not None:
+                    db.execute("DELETE FROM scores WHERE key = ?", (key,))
+                    db.commit()
+                    self.evictions += 1
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: dict):
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, dict(value))
+            db = self._connection()
+            if db is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO scores (key, value, created) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), now)
+                )
+                self._writes += 1
+                if self._writes % SCORE_CACHE_SWEEP_EVERY == 0:
+                    # Rows nobody reads again would otherwise stay forever
+                    db.execute("DELETE FROM scores WHERE created < ?", (now - self.ttl,))
+                db.commit()
+
+    def _remember(self, key: str, created: float, value: dict):
+        self._entries[key] = (created, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "persistent": bool(self.db_path),
+                "hits": self.hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+            }
@@ -0,0 +1,82 @@
+import argparse
+import gc
+import logging
+import os
+
+import torch
+from gunicorn.app.base import BaseApplication
+
+import backend
+
+# Defaults split the cores evenly: WORKERS x THREADS_PER_WORKER ~= cpu count
+THREADS_PER_WORKER = int(os.environ.get("SERVE_THREADS_PER_WORKER", 4))
+WORKERS = int(os.environ.get("SERVE_WORKERS", max(1, (os.cpu_count() or 1) // THREADS_PER_WORKER)))
+# HTTP threads per worker; several are needed for the micro-batcher to see concurrent requests
+HTTP_THREADS = int(os.environ.get("SERVE_HTTP_THREADS", 8))
+BIND = os.environ.get("SERVE_BIND", "0.0.0.0:5000")
+
+
+class PreforkServer(BaseApplication):
+    # Loads the model once in the master process and forks workers from it, so
+    # the weights are shared copy-on-write instead of loaded once per worker
+    def __init__(self, app, options, threads_per_worker):
+        self.application = app
+        self.options = options
+        self.threads_per_worker = threads_per_worker
+        self.preloaded = None
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+        self.cfg.set("post_fork", self.post_fork)
+
+    def load(self):
+        return self.application
+
+    def preload_model(self):
+        # No forward pass here: torch's intra-op thread pool must not be
+        # started before fork, so warm-up happens inside each worker
+        self.preloaded = backend.build_detector(warmup=False)
+        # Move everything allocated so far out of the GC's reach so collections
+        # in the workers don't touch (and copy) the shared pages
+        gc.freeze()
+
+    def post_fork(self, server, worker):
+        torch.set_num_threads(self.threads_per_worker)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass
+        backend.warm_up(self.preloaded)
+        # Also starts this worker's model watcher. An admin reload only reaches
+        # the worker that handled it, so MODEL_WATCH_INTERVAL is the way to
+        # hot-swap every worker.
+        backend.activate_detector(self.preloaded)
+        logging.info(f"Worker {worker.pid} ready with {self.threads_per_worker} torch threads")
+
+
+def serve(workers=WORKERS, threads_per_worker=THREADS_PER_WORKER, http_threads=HTTP_THREADS, bind=BIND):
+    logging.info(f"Starting {workers} workers x {threads_per_worker} torch threads on {bind}")
+    server = PreforkServer(backend.app, {
+        "bind": bind,
+        "workers": workers,
+        "worker_class": "gthread",
+        "threads": http_threads,
+        # Model load and warm-up can exceed gunicorn's default 30s
+        "timeout": 120,
+    }, threads_per_worker)
+    server.preload_model()
+    server.run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the RoBERTa backend with pre-forked workers")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--threads-per-worker", type=int, default=THREADS_PER_WORKER,
+                        help="torch intra-op threads in each worker")
+    parser.add_argument("--http-threads", type=int, default=HTTP_THREADS)
+    parser.add_argument("--bind", default=BIND)
+    args = parser.parse_args()
+
+    serve(args.workers, args.threads_per_worker, args.http_threads, args.bind)
@@ -0,0 +1,170 @@
+import argparse
+import csv
+import json
+import os
+import re
+import threading
+import zlib
+from typing import List, Tuple
+
+import numpy as np
+
+from dataset_columns import META_COLUMNS, LABEL_COLUMN
+
+EMBEDDING_DIM = 1024
+TOP_K = 8
+
+_word_pattern = re.compile(r"[a-z']+")
+
+
+def embed_texts(texts: List[str], dim: int = EMBEDDING_DIM) -> np.ndarray:
+    # Signed feature hashing of unigrams and bigrams with sublinear term
+    # frequency, L2-normalised so a dot product is the cosine similarity.
+    # crc32 keeps the hashing stable across processes, unlike hash().
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = _word_pattern.findall((text or "").lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        counts = {}
+        for feature in features:
+            counts[feature] = counts.get(feature, 0) + 1
+        for feature, count in counts.items():
+            hashed = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if hashed & 0x80000000 else -1.0
+            matrix[row, hashed % dim] += sign * (1.0 + np.log(count))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class SimilarityIndex:
+    # One partition per question, each stored as two raw float32 files
+    # (embeddings and labels) that are memory-mapped for search and grown by
+    # appending bytes, so new labelled data never rewrites what is on disk
+    def __init__(self, path: str, dim: int = EMBEDDING_DIM):
+        self.path = path
+        self.dim = dim
+        self._lock = threading.Lock()
+        self.questions = {}
+        self._partitions = {}
+
+        meta_file = os.path.join(path, "meta.json")
+        if os.path.exists(meta_file):
+            with open(meta_file) as f:
+                meta = json.load(f)
+            self.dim = meta["dim"]
+            self.questions = meta["questions"]
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        return re.sub(r"\s+", " ", question or "").strip().lower()
+
+    def _files(self, partition_id: int) -> Tuple[str, str]:
+        return (os.path.join(self.path, f"q{partition_id}.f32"),
+                os.path.join(self.path, f"q{partition_id}.labels.f32"))
+
+    def _partition(self, partition_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        if partition_id not in self._partitions:
+            embeddings_file, labels_file = self._files(partition_id)
+            count = os.path.getsize(labels_file) // 4
+            if count == 0:
+                return np.zeros((0, self.dim), np.float32), np.zeros(0, np.float32)
+            self._partitions[partition_id] = (
+                np.memmap(embeddings_file, dtype=np.float32, mode="r", shape=(count, self.dim)),
+                np.memmap(labels_file, dtype=np.float32, mode="r", shape=(count,)),
+            )
+        return self._partitions[partition_id]
+
+    def __len__(self):
+        return sum(len(self._partition(pid)[1]) for pid in self.questions.values())
+
+    def append(self, question: str, answers: List[str], labels: List[float]):
+        key = self.normalize_question(question)
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            if key not in self.questions:
+                self.questions[key] = len(self.questions)
+            partition_id = self.questions[key]
+            embeddings_file, labels_file = self._files(partition_id)
+            with open(embeddings_file, "ab") as f:
+                f.write(embed_texts(answers, self.dim).tobytes())
+            with open(labels_file, "ab") as f:
+                f.write(np.asarray(labels, dtype=np.float32).tobytes())
+            with open(os.path.join(self.path, "meta.json"), "w") as f:
+                json.dump({"dim": self.dim, "questions": self.questions}, f)
+            # Re-map on next search so the new rows are visible
+            self._partitions.pop(partition_id, None)
+
+    def score(self, question: str, answers: List[str], k: int = TOP_K) -> List[Tuple[float, float]]:
+        # Returns (score on the 1-10 scale, confidence 0-100) per answer
+        if not answers:
+            return []
+        partition_id = self.questions.get(self.normalize_question(question))
+        partition_ids = [partition_id] if partition_id is not None else list(self.questions.values())
+
+        queries = embed_texts(answers, self.dim)
+        similarities = []
+        labels = []
+        for pid in partition_ids:
+            embeddings, partition_labels = self._partition(pid)
+            if len(partition_labels):
+                # One matmul scores every answer against the whole partition
+                similarities.append(queries @ embeddings.T)
+                labels.append(np.asarray(partition_labels))
+        if not similarities:
+            return [(5.0, 0.0)] * len(answers)
+
+        similarities = np.hstack(similarities)
+        labels = np.concatenate(labels)
+        k = min(k, similarities.shape[1])
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        top_similarities = np.clip(np.take_along_axis(similarities, top, axis=1), 0, None)
+        top_labels = labels[top]
+
+        weights = top_similarities.sum(axis=1)
+        scores = np.where(
+            weights > 0,
+            (top_similarities * top_labels).sum(axis=1) / np.where(weights > 0, weights, 1),
+            top_labels.mean(axis=1)
+        )
+        # Confidence is the mean cosine similarity of the neighbours used
+        confidences = top_similarities.mean(axis=1) * 100
+        return [(round(float(s), 2), round(float(c), 2)) for s, c in zip(scores, confidences)]
+
+
+def index_csv(csv_path: str, index_path: str, dim: int = EMBEDDING_DIM, chunk_size: int = 5000) -> SimilarityIndex:
+    # Appends every labelled answer of a wide dataset.py CSV to the index
+    index = SimilarityIndex(index_path, dim)
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        question_columns = [c for c in reader.fieldnames if c not in META_COLUMNS and c != LABEL_COLUMN]
+        pending = {question: ([], []) for question in question_columns}
+        rows = 0
+        for row in reader:
+            if not (row.get(LABEL_COLUMN) or '').strip():
+                continue
+            for question in question_columns:
+                answer = (row.get(question) or '').strip()
+                if answer and answer != 'No response':
+                    pending[question][0].append(answer)
+                    pending[question][1].append(float(row[LABEL_COLUMN]))
+            rows += 1
+            if rows % chunk_size == 0:
+                for question, (answers, labels) in pending.items():
+                    index.append(question, answers, labels)
+                pending = {question: ([], []) for question in question_columns}
+        for question, (answers, labels) in pending.items():
+            if answers:
+                index.append(question, answers, labels)
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or extend the nearest-neighbour answer index")
+    parser.add_argument("--data", default="depression_dataset.csv", help="Wide labelled CSV to append")
+    parser.add_argument("--index", default="models/similarity_index")
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM)
+    args = parser.parse_args()
+
+    built = index_csv(args.data, args.index, args.dim)
+    print(f"Index at {args.index} holds {len(built)} labelled answers across {len(built.questions)} questions")
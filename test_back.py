@@ -0,0 +1,78 @@
+import json
+import os
+import re
+import threading
+
+import pytest
+
+from benchmark import FakeOllamaHandler, start_fake_ollama
+
+MAX_CONCURRENCY = 2
+
+
+class ScoringOllamaHandler(FakeOllamaHandler):
+    # Answers "score N" with N and anything else with unparseable text, and
+    # records how many calls were in flight at once. start_fake_ollama
+    # subclasses the handler, so the counters are written to this class
+    # explicitly rather than through type(self).
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+
+    def reply_content(self, body):
+        match = re.search(r"score (\d+)", body['messages'][-1]['content'])
+        if match is None:
+            return "I would rather not say."
+        return json.dumps({"depression_score": int(match.group(1)), "notes": "fake assessment"})
+
+    def do_POST(self):
+        cls = ScoringOllamaHandler
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            super().do_POST()
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+
+fake_ollama = start_fake_ollama(0.02, ScoringOllamaHandler)
+# back.py reads these at import time, and ollama builds its default client
+# from OLLAMA_HOST when it is first imported, so they are set before either
+os.environ['OLLAMA_HOST'] = f"http://127.0.0.1:{fake_ollama.server_address[1]}"
+os.environ['LLM_CONCURRENT_SCORING'] = '1'
+os.environ['LLM_MAX_CONCURRENCY'] = str(MAX_CONCURRENCY)
+os.environ['LLM_STRUCTURED_OUTPUT'] = '0'
+os.environ['SCORE_CACHE_DB'] = ''
+
+pytest.importorskip("flask")
+pytest.importorskip("ollama")
+
+import back  # noqa: E402
+
+
+def responses_for(answers, tag):
+    # tag keeps answers unique across tests so the score cache stays out of the way
+    return [back.QuestionResponse(i + 1, f"Question {i + 1} ({tag})?", answer) for i, answer in enumerate(answers)]
+
+
+def test_scores_keep_input_order():
+    answers = [f"score {n}" for n in (9, 1, 7, 3, 5, 2, 8, 4)]
+    scores = back.score_responses(responses_for(answers, "order"), mode="per_question")
+    assert [score for score, _ in scores] == [9, 1, 7, 3, 5, 2, 8, 4]
+
+
+def test_unparseable_answer_falls_back_to_neutral_score():
+    answers = ["score 8", "no score here", "score 2"]
+    scores = back.score_responses(responses_for(answers, "fallback"), mode="per_question")
+    assert scores[0][0] == 8
+    assert scores[1] == (5, back.FALLBACK_NOTES)
+    assert scores[2][0] == 2
+
+
+def test_in_flight_calls_are_capped():
+    ScoringOllamaHandler.max_in_flight = 0
+    answers = [f"score {n % 10 + 1}" for n in range(12)]
+    back.score_responses(responses_for(answers, "cap"), mode="per_question")
+    assert 1 < ScoringOllamaHandler.max_in_flight <= MAX_CONCURRENCY
@@ -1,50 +1,256 @@
 import torch
 from transformers import RobertaTokenizer, RobertaForSequenceClassification
-from transformers import TrainingArguments, Trainer
-from torch.utils.data import Dataset
+from transformers import TrainingArguments, Trainer, EarlyStoppingCallback
+from torch.utils.data import Dataset, DataLoader, Sampler
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
+import hashlib
+import json
+import os
+import random
+import resource
+import time
+import argparse
+
+from convert_dataset import level_to_label
 
 class DepressionDataset(Dataset):
-    def __init__(self, texts, labels, tokenizer, max_length=128):
-        self.encodings = tokenizer(texts, truncation=True, padding=True, max_length=max_length)
+    def __init__(self, texts, labels, tokenizer, max_length=128, teacher_scores=None):
+        # Left unpadded; DynamicPaddingCollator pads each batch to its own longest text
+        self.encodings = tokenizer(texts, truncation=True, max_length=max_length)
         self.labels = labels
+        self.teacher_scores = teacher_scores
+        self.lengths = [len(ids) for ids in self.encodings['input_ids']]
 
     def __getitem__(self, idx):
         item = {key: torch.tensor(val[idx]) for key, val in self.encodings.items()}
         item['labels'] = torch.tensor(self.labels[idx])
+        if self.teacher_scores is not None:
+            item['teacher_scores'] = torch.tensor(float(self.teacher_scores[idx]))
         return item
 
     def __len__(self):
         return len(self.labels)
 
-def train_depression_model(train_data_path, output_dir="models/depression_roberta"):
-    # Load and preprocess data
-    df = pd.read_csv(train_data_path)
-    texts = df['text'].tolist()  # Combine question and response if needed
-    labels = df['depression_level'].tolist()  # Assuming 1-5 scale
+def token_cache_key(texts, labels, tokenizer_name, max_length):
+    digest = hashlib.sha256()
+    digest.update(f"{tokenizer_name}|{max_length}|{len(texts)}".encode("utf-8"))
+    for text, label in zip(texts, labels):
+        digest.update(str(text).encode("utf-8"))
+        digest.update(b"\x1f")
+        digest.update(str(label).encode("utf-8"))
+        digest.update(b"\x1e")
+    return digest.hexdigest()[:16]
 
-    # Split data
-    train_texts, val_texts, train_labels, val_labels = train_test_split(
-        texts, labels, test_size=0.2, random_state=42
-    )
+def build_token_cache(texts, labels, tokenizer, tokenizer_name, cache_dir, max_length=128, chunk_size=10000):
+    # Tokenizes once into fixed-width .npy files; reruns with the same
+    # tokenizer, max_length and data reuse them without touching the tokenizer
+    path = os.path.join(cache_dir, token_cache_key(texts, labels, tokenizer_name, max_length))
+    if os.path.exists(os.path.join(path, "meta.json")):
+        return path
 
-    # Initialize tokenizer and model
-    tokenizer = RobertaTokenizer.from_pretrained('roberta-base')
-    model = RobertaForSequenceClassification.from_pretrained(
-        'roberta-base',
-        num_labels=5,  # 5 levels of depression severity
-        output_attentions=False,
-        output_hidden_states=False
-    )
+    os.makedirs(path, exist_ok=True)
+    count = len(texts)
+    input_ids = np.lib.format.open_memmap(os.path.join(path, "input_ids.npy"), mode="w+",
+                                          dtype=np.int32, shape=(count, max_length))
+    attention_mask = np.lib.format.open_memmap(os.path.join(path, "attention_mask.npy"), mode="w+",
+                                               dtype=np.int8, shape=(count, max_length))
+    lengths = np.lib.format.open_memmap(os.path.join(path, "lengths.npy"), mode="w+",
+                                        dtype=np.int16, shape=(count,))
 
-    # Create datasets
-    train_dataset = DepressionDataset(train_texts, train_labels, tokenizer)
-    val_dataset = DepressionDataset(val_texts, val_labels, tokenizer)
+    for start in range(0, count, chunk_size):
+        end = min(start + chunk_size, count)
+        encoded = tokenizer(list(texts[start:end]), truncation=True, padding="max_length",
+                            max_length=max_length, return_tensors="np")
+        input_ids[start:end] = encoded["input_ids"]
+        attention_mask[start:end] = encoded["attention_mask"]
+        lengths[start:end] = encoded["attention_mask"].sum(axis=1)
 
-    # Define training arguments
-    training_args = TrainingArguments(
+    np.save(os.path.join(path, "labels.npy"), np.asarray(labels, dtype=np.int16))
+    input_ids.flush()
+    attention_mask.flush()
+    lengths.flush()
+
+    # Written last so a crash mid-build is rebuilt on the next run
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump({"tokenizer": tokenizer_name, "max_length": max_length, "count": count}, f)
+    return path
+
+class CachedDepressionDataset(Dataset):
+    # Reads a build_token_cache directory through memory maps, so RAM stays
+    # flat no matter how large the corpus is
+    def __init__(self, cache_path):
+        self.input_ids = np.load(os.path.join(cache_path, "input_ids.npy"), mmap_mode="r")
+        self.attention_mask = np.load(os.path.join(cache_path, "attention_mask.npy"), mmap_mode="r")
+        self.lengths = np.load(os.path.join(cache_path, "lengths.npy"), mmap_mode="r")
+        self.labels = np.load(os.path.join(cache_path, "labels.npy"), mmap_mode="r")
+
+    def __getitem__(self, idx):
+        # Trim the stored max_length padding; the collator re-pads per batch
+        length = int(self.lengths[idx])
+        return {
+            'input_ids': torch.from_numpy(self.input_ids[idx, :length].astype(np.int64)),
+            'attention_mask': torch.from_numpy(self.attention_mask[idx, :length].astype(np.int64)),
+            'labels': torch.tensor(int(self.labels[idx]))
+        }
+
+    def __len__(self):
+        return len(self.labels)
+
+class DynamicPaddingCollator:
+    def __init__(self, pad_token_id):
+        self.pad_token_id = pad_token_id
+
+    def __call__(self, features):
+        longest = max(len(feature['input_ids']) for feature in features)
+        input_ids = torch.full((len(features), longest), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(features), longest), dtype=torch.long)
+        for row, feature in enumerate(features):
+            length = len(feature['input_ids'])
+            input_ids[row, :length] = torch.as_tensor(feature['input_ids'])
+            attention_mask[row, :length] = torch.as_tensor(feature['attention_mask'])
+        batch = {
+            'input_ids': input_ids,
+            'attention_mask': attention_mask,
+            'labels': torch.stack([torch.as_tensor(feature['labels']) for feature in features])
+        }
+        if 'teacher_scores' in features[0]:
+            batch['teacher_scores'] = torch.stack([feature['teacher_scores'] for feature in features])
+        return batch
+
+class LengthGroupedBatchSampler(Sampler):
+    # Shuffles, cuts the indices into megabatches of batch_size * megabatch_factor,
+    # sorts each megabatch by length and splits it into batches. A larger
+    # megabatch_factor groups lengths more tightly at the cost of randomness;
+    # megabatch_factor=1 is plain shuffled batching.
+    def __init__(self, lengths, batch_size, megabatch_factor=50, shuffle=True, seed=42):
+        self.lengths = lengths
+        self.batch_size = batch_size
+        self.megabatch_factor = megabatch_factor
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+
+    def batches(self):
+        indices = list(range(len(self.lengths)))
+        rng = random.Random(self.seed + self.epoch)
+        if self.shuffle:
+            rng.shuffle(indices)
+
+        megabatch_size = self.batch_size * self.megabatch_factor
+        batches = []
+        for start in range(0, len(indices), megabatch_size):
+            megabatch = sorted(indices[start:start + megabatch_size], key=lambda i: self.lengths[i], reverse=True)
+            batches.extend(megabatch[i:i + self.batch_size] for i in range(0, len(megabatch), self.batch_size))
+
+        if self.shuffle:
+            rng.shuffle(batches)
+        return batches
+
+    def __iter__(self):
+        batches = self.batches()
+        self.epoch += 1
+        return iter(batches)
+
+    def __len__(self):
+        return (len(self.lengths) + self.batch_size - 1) // self.batch_size
+
+def pad_fraction(lengths, batches):
+    padded = sum(max(lengths[i] for i in batch) * len(batch) for batch in batches)
+    return 1 - sum(lengths) / padded if padded else 0
+
+def padding_report(lengths, batch_size, megabatch_factor=50):
+    lengths = [int(length) for length in lengths]
+    # Before: everything padded to the longest text in the corpus
+    before = 1 - sum(lengths) / (max(lengths) * len(lengths)) if lengths else 0
+    random_batches = LengthGroupedBatchSampler(lengths, batch_size, megabatch_factor=1).batches()
+    grouped_batches = LengthGroupedBatchSampler(lengths, batch_size, megabatch_factor).batches()
+    return {
+        'corpus_padding': round(before, 4),
+        'dynamic_padding': round(pad_fraction(lengths, random_batches), 4),
+        'length_grouped_padding': round(pad_fraction(lengths, grouped_batches), 4),
+    }
+
+class LengthGroupedTrainer(Trainer):
+    def __init__(self, *args, megabatch_factor=50, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.megabatch_factor = megabatch_factor
+
+    def get_train_dataloader(self):
+        batch_sampler = LengthGroupedBatchSampler(
+            self.train_dataset.lengths,
+            self.args.per_device_train_batch_size,
+            megabatch_factor=self.megabatch_factor,
+            seed=self.args.seed
+        )
+        # prepare() shards the batches across processes under a distributed
+        # launch, as the base Trainer does for its own loader
+        return self.accelerator.prepare(DataLoader(
+            self.train_dataset,
+            batch_sampler=batch_sampler,
+            collate_fn=self.data_collator,
+            num_workers=self.args.dataloader_num_workers,
+            pin_memory=self.args.dataloader_pin_memory,
+            persistent_workers=self.args.dataloader_num_workers > 0 and self.args.dataloader_persistent_workers
+        ))
+
+class DistillationTrainer(LengthGroupedTrainer):
+    # Trains against the LLM teacher's 1-10 scores as well as the hard labels.
+    # Each teacher score becomes a soft distribution over the 5 levels centred
+    # on (score + 0.5) / 2, the inverse of the 2L - 0.5 mapping cascade.py uses.
+    def __init__(self, *args, soft_target_width=0.75, soft_weight=0.7, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.soft_target_width = soft_target_width
+        self.soft_weight = soft_weight
+
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
+        teacher_scores = inputs.pop('teacher_scores', None)
+        outputs = model(**inputs)
+        loss = outputs.loss
+        if teacher_scores is not None:
+            levels = torch.arange(1, 6, dtype=torch.float32, device=outputs.logits.device)
+            centres = (teacher_scores.float().unsqueeze(1) + 0.5) / 2
+            targets = torch.softmax(-(levels - centres) ** 2 / (2 * self.soft_target_width ** 2), dim=1)
+            soft_loss = torch.nn.functional.kl_div(
+                torch.log_softmax(outputs.logits.float(), dim=1), targets, reduction='batchmean'
+            )
+            loss = self.soft_weight * soft_loss + (1 - self.soft_weight) * loss
+        return (loss, outputs) if return_outputs else loss
+
+def cpu_supports_bf16():
+    # bf16 autocast on CPU only pays off with native support (AVX512-BF16 / AMX)
+    check = getattr(torch.cpu, "_is_avx512_bf16_supported", None)
+    return bool(check and check())
+
+def training_arguments(profile, output_dir):
+    if profile == "cpu":
+        cores = os.cpu_count() or 1
+        # Leave a few cores to the data-loader workers, the rest go to torch
+        workers = min(4, max(1, cores // 8))
+        torch.set_num_threads(max(1, cores - workers))
+        return TrainingArguments(
+            output_dir=output_dir,
+            use_cpu=True,
+            bf16=cpu_supports_bf16(),
+            num_train_epochs=6,
+            per_device_train_batch_size=32,
+            per_device_eval_batch_size=128,
+            gradient_accumulation_steps=2,
+            warmup_ratio=0.06,
+            weight_decay=0.01,
+            logging_dir='./logs',
+            logging_steps=50,
+            evaluation_strategy="epoch",
+            save_strategy="epoch",
+            save_total_limit=2,
+            load_best_model_at_end=True,
+            metric_for_best_model="eval_loss",
+            dataloader_num_workers=workers,
+            dataloader_persistent_workers=True,
+        )
+
+    return TrainingArguments(
         output_dir=output_dir,
         num_train_epochs=3,
         per_device_train_batch_size=16,
@@ -58,20 +264,98 @@ def train_depression_model(train_data_path, output_dir="models/depression_robert
         load_best_model_at_end=True,
     )
 
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux; children covers data-loader workers
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(own / 1024, 1), round(children / 1024, 1)
+
+def train_depression_model(train_data_path, output_dir="models/depression_roberta", cache_dir=None,
+                           megabatch_factor=50, profile="default", base_model="roberta-base",
+                           teacher_column=None):
+    # Load and preprocess data
+    if train_data_path.endswith('.parquet'):
+        # Output of convert_dataset.py or distill.py
+        df = pd.read_parquet(train_data_path)
+    else:
+        df = pd.read_csv(train_data_path)
+    texts = df['text'].tolist()  # Combine question and response if needed
+    labels = df['depression_level'].map(level_to_label).tolist()
+    teacher_scores = df[teacher_column].astype(float).tolist() if teacher_column else [None] * len(texts)
+
+    # Split data
+    train_texts, val_texts, train_labels, val_labels, train_teacher, val_teacher = train_test_split(
+        texts, labels, teacher_scores, test_size=0.2, random_state=42
+    )
+
+    # Initialize tokenizer and model
+    tokenizer = RobertaTokenizer.from_pretrained(base_model)
+    model = RobertaForSequenceClassification.from_pretrained(
+        base_model,
+        num_labels=5,  # 5 levels of depression severity
+        output_attentions=False,
+        output_hidden_states=False
+    )
+
+    # Create datasets
+    if cache_dir and not teacher_column:
+        train_dataset = CachedDepressionDataset(
+            build_token_cache(train_texts, train_labels, tokenizer, base_model, cache_dir)
+        )
+        val_dataset = CachedDepressionDataset(
+            build_token_cache(val_texts, val_labels, tokenizer, base_model, cache_dir)
+        )
+    else:
+        if cache_dir:
+            print("Token cache does not store teacher scores; tokenizing in memory")
+        train_dataset = DepressionDataset(train_texts, train_labels, tokenizer,
+                                          teacher_scores=train_teacher if teacher_column else None)
+        val_dataset = DepressionDataset(val_texts, val_labels, tokenizer,
+                                        teacher_scores=val_teacher if teacher_column else None)
+
+    # Define training arguments
+    training_args = training_arguments(profile, output_dir)
+
+    report = padding_report(train_dataset.lengths, training_args.per_device_train_batch_size, megabatch_factor)
+    print(f"Pad-token fraction: {json.dumps(report)}")
+
     # Initialize trainer
-    trainer = Trainer(
+    trainer_class = DistillationTrainer if teacher_column else LengthGroupedTrainer
+    trainer = trainer_class(
         model=model,
         args=training_args,
         train_dataset=train_dataset,
-        eval_dataset=val_dataset
+        eval_dataset=val_dataset,
+        data_collator=DynamicPaddingCollator(tokenizer.pad_token_id),
+        megabatch_factor=megabatch_factor,
+        callbacks=[EarlyStoppingCallback(early_stopping_patience=2)] if profile == "cpu" else None
     )
 
     # Train the model
-    trainer.train()
+    started = time.time()
+    result = trainer.train()
+    own_rss, children_rss = peak_rss_mb()
+    print(f"Training took {time.time() - started:.1f}s, "
+          f"{result.metrics.get('train_samples_per_second')} samples/sec, "
+          f"peak RSS {own_rss} MB (data-loader workers {children_rss} MB)")
 
     # Save the model and tokenizer
     model.save_pretrained(output_dir)
     tokenizer.save_pretrained(output_dir)
+    return result
 
 if __name__ == "__main__":
-    train_depression_model("training_data.csv")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Fine-tune RoBERTa for depression level classification")
+    parser.add_argument("data", nargs="?", default="training_data.csv")
+    parser.add_argument("--output-dir", default="models/depression_roberta")
+    parser.add_argument("--cache-dir", default=None, help="Reuse tokenized data from this directory")
+    parser.add_argument("--profile", choices=["default", "cpu"], default="default",
+                        help="'cpu' tunes threads, workers, bf16 and evaluation for many-core CPU hosts")
+    parser.add_argument("--base-model", default="roberta-base",
+                        help="Checkpoint to fine-tune, e.g. distilroberta-base for a faster student")
+    parser.add_argument("--teacher-column", default=None,
+                        help="Column of 1-10 LLM scores to distil from, as written by distill.py")
+    args = parser.parse_args()
+
+    train_depression_model(args.data, args.output_dir, cache_dir=args.cache_dir, profile=args.profile,
+                           base_model=args.base_model, teacher_column=args.teacher_column)
\ No newline at end of file